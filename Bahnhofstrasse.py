@@ -6,8 +6,10 @@ import plotly.graph_objects as go
 import plotly.express as px
 from dash.dependencies import Input, Output
 import pandas as pd
-from itertools import chain
-from DataHelper import DataManager
+import numpy as np
+from collections import namedtuple
+from DataHelper import DatasetRegistry, DATASETS, DEFAULT_DATASET, TIME_BUCKETS, DEFAULT_TIME_BUCKETS, DAYS, connector_arrays, \
+    LOCAL_TZ, to_utc
 
 import logging
 logging.basicConfig(level=logging.DEBUG)
@@ -28,13 +30,46 @@ LOG.addHandler(ch)
 LOG.addHandler(fh)
 
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# the page is filled in by a callback once the dataset is known, so the callbacks refer to
+# components that are not in the initial layout
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
+                suppress_callback_exceptions=True)
 app.title = 'bahnofstasse_pedestrians.com'
+server = app.server
 
-data_manager = DataManager()
+# how often the source csv is checked for new data, None disables hot reloading
+RELOAD_INTERVAL_SECONDS = 60
+
+# when serving with several worker processes: the prepared data is published once as a
+# memory mapped file and shared read-only by all workers
+SHARED_DATA = False
+
+# at most this many datasets are held in memory, the least recently viewed is dropped first
+MAX_OPEN_DATASETS = 4
+
+# the data and the page built from it, swapped in as a whole when the data changes
+Snapshot = namedtuple('Snapshot', ['data_manager', 'layout'])
+
+# the time of day bucket configurations (DataHelper.TIME_BUCKETS) offered for the card graph
+TIME_BUCKET_OPTIONS = {
+    'quarters': ' Night / Morning / Afternoon / Evening',
+    'opening_hours': ' Shop opening hours',
+}
 
 COLOR_PALETTE = ['#203c3b', '#447270', '#6b9493', '#F6E271', '#F6b915']
 
+# the count types to choose from and their columns
+COUNT_OPTIONS = {
+    'both': ' Adults & Children',
+    'adults': ' Adults',
+    'children': ' Children'
+}
+COUNT_COLUMNS = {'both': 'pedestrians_count', 'adults': 'adult_pedestrians_count',
+                 'children': 'child_pedestrians_count'}
+
+# location selector value of the sum over all locations
+ALL_LOCATIONS = 'all'
+
 
 def default_fig_layout(fig):
     fig.update_layout(
@@ -85,71 +120,152 @@ def default_fig_layout(fig):
     return fig
 
 
-breakdown_card = dbc.Card(
-    [
-        dbc.CardHeader(
-            dcc.Tabs(
-                [
+def px_frame(df):
+    # px groups by every category of a categorical column, those without rows (e.g. months
+    # missing from a short dataset) raise a KeyError, so they are removed
+    df = df.reset_index()
+    for column in df.select_dtypes('category'):
+        df[column] = df[column].cat.remove_unused_categories()
+    return df
 
-                    #dcc.Tab(label="Bahnhofstrasse (Nord)", id="Bahnhofstrasse (Nord)", value="Bahnhofstrasse (Nord)", className="my-tab-one", selected_className='custom-tab-selected'),
-                    dcc.Tab(label="Bahnhofstrasse (Mitte)", id="Bahnhofstrasse (Mitte)", value="Bahnhofstrasse (Mitte)", className="my-tab-one",selected_className='custom-tab-selected'),
-                    dcc.Tab(label="Bahnhofstrasse (Süd)", id="Bahnhofstrasse (Süd)", value="Bahnhofstrasse (Süd)", className="my-tab-one",selected_className='custom-tab-selected')
 
-                ],
-                id="card-tabs", value="Bahnhofstrasse (Mitte)",
-                className="card-header"
-            )
-        ),
-        dbc.CardBody(dcc.Graph(id="card_graph", figure={}, config={
-                'displayModeBar': False
-            }))
-    ],className="top-card"
+def time_bucket_texts(buckets):
+    # label -> e.g. "from 00:00 until 06:00" for a TIME_BUCKETS configuration
+    boundaries, labels = TIME_BUCKETS[buckets]
+    texts = {}
+    for label, start, end in zip(labels, boundaries, boundaries[1:] + (24,)):
+        text = f"from {start:02d}:00 until {end:02d}:00"
+        texts[label] = f"{texts[label]}, {text}" if label in texts else text
+    return texts
+
+
+def make_time_bucket_cols(buckets):
+    # one column per time of day of the selected buckets, e.g. "Morning: from 06:00 until 12:00"
+    return [
+        dbc.Col(
+            html.Div([html.Span([f"{label}: "], className="explain-title"), text],
+                     className="container-fluid"),
+            width={'size': 2, "offset": 3 if order == 1 else 0, 'order': order})
+        for order, (label, text) in enumerate(time_bucket_texts(buckets).items(), start=1)
+    ]
+
+
+@app.callback(
+    Output("time_bucket_texts", "children"), [Input("time_buckets_radio", "value")]
 )
+def update_time_bucket_texts(buckets):
+    # the explanation follows the buckets chosen for the breakdown
+    return make_time_bucket_cols(buckets)
+
+
+def ordinal(day):
+    suffix = 'th' if 11 <= day <= 13 else {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+    return f"{day}{suffix}"
+
+
+def period_text(data_manager, period, separator):
+    # e.g. "1st November 2022 until 20th October 2023", the end of a period is exclusive
+    start, end = data_manager.periods[period]
+    last_day = end - pd.Timedelta(hours=1)
+    return f"{ordinal(start.day)} {start:%B %Y} {separator} {ordinal(last_day.day)} {last_day:%B %Y}"
+
+
+def make_breakdown_card(data_manager):
+    # one tab per location counted in the last 12 months, the busiest one is selected
+    return dbc.Card(
+        [
+            dbc.CardHeader(
+                dcc.Tabs(
+                    [
+                        dcc.Tab(label=location, id=location, value=location, className="my-tab-one",
+                                selected_className='custom-tab-selected')
+                        for location in counted_locations(data_manager)
+                    ],
+                    id="card-tabs", value=busiest_location(data_manager),
+                    className="card-header"
+                )
+            ),
+            dbc.CardBody(dcc.Graph(id="card_graph", figure={}, config={
+                    'displayModeBar': False
+                }))
+        ],className="top-card"
+    )
+
+
+def busiest_location(data_manager):
+    return data_manager.summary().location_totals.index[0]
+
+
+def counted_locations(data_manager):
+    # the locations with counts in the last 12 months in category order, a location that only
+    # has rows in the previous 12 months has nothing to show
+    counted = data_manager.summary().location_totals.index
+    return [location for location in data_manager.locations if location in counted]
+
+
+def location_colors(data_manager, highlight=COLOR_PALETTE[3], other=COLOR_PALETTE[1]):
+    # location -> colour, the busiest location is highlighted
+    busiest = busiest_location(data_manager)
+    return {location: highlight if location == busiest else other for location in counted_locations(data_manager)}
+
+
+def dataset_id(pathname):
+    # the dataset is chosen by the url, e.g. /bahnhofstrasse, "/" is the default dataset
+    return (pathname or '/').strip('/') or DEFAULT_DATASET
 
 
 @app.callback(
     Output("card_graph", "figure"), [Input("card-tabs", "value"),
-                                     Input("radio_button", "value")]
+                                     Input("radio_button", "value"),
+                                     Input("url", "pathname"),
+                                     Input("time_buckets_radio", "value")]
     
 )
-def update_fig_4_1(selected_data,radio_button_value):
-      
-    df = data_manager.location_date_time_last_year().reset_index()
-
-    location = selected_data
-    
-    df = df[df["location_name"] == location]
+def update_fig_4_1(selected_data,radio_button_value,pathname,buckets):
+
+    # one snapshot for the whole callback, even if a reload swaps it meanwhile
+    data_manager = data_sources.current(dataset_id(pathname)).data_manager
+    # a location that is gone after a reload falls back to the busiest one
+    location = selected_data if selected_data in counted_locations(data_manager) else busiest_location(data_manager)
+    # only the location's slice of the cube is reduced
+    df = data_manager.location_date_time_last_year(buckets, location).reset_index()
     df = df.set_index('month', drop=False)
 
     fig = go.Figure()
 
-    if (location == 'Bahnhofstrasse (Mitte)') & (radio_button_value == 'children' ):
-        fig.update_layout(title="December afternoons had the most child pedestrians.<br> Child pedestrians counts were much smaller than adult pedestrian counts.")
-    elif (location == 'Bahnhofstrasse (Mitte)') & (radio_button_value != 'children' ):
-        fig.update_layout(title="December afternoons had the most pedestrians.")
-    elif  (location == 'Bahnhofstrasse (Süd)') & (radio_button_value == 'children') :
-        fig.update_layout(title="Afternoons were the busiest, but Bahnhofstrasse (Mitte) <br> has almost double the pedestrian counts. <br> Child pedestrians counts were much smaller than adult pedestrian counts.")
-    elif  (location == 'Bahnhofstrasse (Süd)') & (radio_button_value != 'children') :
-        fig.update_layout(title="Afternoons were the busiest, but Bahnhofstrasse (Mitte) <br> had almost double the pedestrian counts.")    
+    column_to_use = COUNT_COLUMNS.get(radio_button_value, 'pedestrians_count')
+
+
+    # the busiest time of day is highlighted
+    busiest = df.groupby('time_of_day', observed=True)[column_to_use].sum().idxmax()
+
+    # the titles compare the location with the busiest one, in the selected count
+    kind = 'child ' if radio_button_value == 'children' else ''
+    busiest_location_name = busiest_location(data_manager)
+    if location == busiest_location_name:
+        busiest_month = df.loc[df["time_of_day"] == busiest, column_to_use].idxmax()
+        title = f"{busiest_month} {busiest.lower()}s had the most {kind}pedestrians."
     else:
-        fig.update_layout(title=" ")
+        totals = data_manager.summary(column=column_to_use).location_totals
+        top, own = totals.reindex([busiest_location_name, location], fill_value=0)
+        title = f"{busiest}s were the busiest"
+        if own > 0:
+            qualifier, ratio = ratio_text(top / own)
+            title += f", but {busiest_location_name} <br> had {qualifier}{ratio} the {kind}pedestrian counts"
+        title += "."
+
+    if radio_button_value == 'children':
+        title += "<br> Child pedestrians counts were much smaller than adult pedestrian counts."
+    fig.update_layout(title=title)
      
     
     fig.update_layout(title_x=0.5, title_y=.95, title_xanchor='center', title_yanchor='top')
 
-    if(radio_button_value == 'children'):
-        column_to_use = 'child_pedestrians_count'    
-    elif (radio_button_value == 'adults'):
-        column_to_use = 'adult_pedestrians_count' 
-    else:
-        column_to_use = 'pedestrians_count'
-
-
     #interate over all times of day
-    for time_of_day in ['Night','Morning','Afternoon','Evening']:
+    for time_of_day in df["time_of_day"].cat.categories:
 
         time_of_day_df = df[df["time_of_day"] == time_of_day]
-        if time_of_day == 'Afternoon':
+        if time_of_day == busiest:
             color = COLOR_PALETTE[3]
         else:
             color = COLOR_PALETTE[1]
@@ -161,7 +277,7 @@ def update_fig_4_1(selected_data,radio_button_value):
                              connectgaps=True,
                              ))
 
-        fig.add_annotation(xref='paper', x=1, y=time_of_day_df.at['September', column_to_use],
+        fig.add_annotation(xref='paper', x=1, y=time_of_day_df[column_to_use].iloc[-1],
                         xanchor='left', yanchor='middle',
                         text=f' {time_of_day}',
                         font=dict(family="Open Sans",
@@ -187,18 +303,15 @@ def update_fig_4_1(selected_data,radio_button_value):
     return fig
 
 
-def make_fig_detections_by_location():
-    location_totals_df = data_manager.count_by_location_last_year().reset_index()
+def make_fig_detections_by_location(data_manager):
+    location_totals_df = px_frame(data_manager.count_by_location_last_year())
 
     
     fig = px.bar(location_totals_df,
                  x="location_name",
                  y="pedestrians_count",
                  color="location_name",
-                 color_discrete_map={'Bahnhofstrasse (Süd)': COLOR_PALETTE[1],
-                                     'Bahnhofstrasse (Mitte)': COLOR_PALETTE[3],
-
-                                     }
+                 color_discrete_map=location_colors(data_manager)
                 )
     
     fig.update_traces(hovertemplate='%{y} <br> pedestrians detected in test %{x}')
@@ -256,8 +369,8 @@ def make_fig_detections_by_location():
 
 
 
-def make_fig_detections_by_month():
-    df = data_manager.count_by_month_last_year().reset_index()
+def make_fig_detections_by_month(data_manager):
+    df = px_frame(data_manager.count_by_month_last_year())
     LOG.debug(df.head())
 
   
@@ -335,37 +448,31 @@ def make_fig_detections_by_month():
     return fig
 
 
-def flatten_list(list_of_lists):
-    flatten_list = list(chain.from_iterable(list_of_lists))
-    
-    #insert NONE for every third step
-    i = 2
-    for x in range(0,12):
-        flatten_list.insert(i,None)
-        i=i+3
-    
-    return flatten_list
+# names of the DataManager periods in the dumbbell chart, the periods are drawn oldest first
+PERIOD_NAMES = {'previous_year': 'previous 12 months', 'last_year': 'last 12 months'}
+PERIOD_COLORS = [COLOR_PALETTE[0], COLOR_PALETTE[2], COLOR_PALETTE[4], COLOR_PALETTE[1]]
 
-def make_dumb_bell():
 
-    df_last = data_manager.count_by_month_last_year().reset_index()
-    df_prev = data_manager.count_by_month_previous_year().reset_index()
-    combined_df = pd.merge(df_prev,df_last, on='month')
-    
-    LOG.debug("make_dumb_bell - combined df:")
-    LOG.debug(combined_df)
+def period_name(period):
+    # a DataManager period by name, (start, end) bounds (strings or timestamps, naive ones are
+    # local time) as e.g. "Jan 2023 - Jun 2023", the end is exclusive
+    if isinstance(period, str):
+        return PERIOD_NAMES.get(period, period)
+    start, end = (to_utc(bound).tz_convert(LOCAL_TZ) for bound in period)
+    return f"{start:%b %Y} - {end - pd.Timedelta(hours=1):%b %Y}"
+
+
+def make_dumb_bell(data_manager, periods=('previous_year', 'last_year')):
+
+    comparison = data_manager.compare_periods(periods, align='month')
     
+    LOG.debug("make_dumb_bell - totals:")
+    LOG.debug(comparison.totals)
     
-    # data twisting to get data for 'line' between points
-    combined_df['line_values'] = combined_df[['pedestrians_count_x', 'pedestrians_count_y',]].values.tolist()
-    combined_df['month_values'] = combined_df[['month', 'month']].values.tolist()
-    list_of_lists_x = combined_df['line_values'].values.tolist()
-    list_of_lists_y = combined_df['month_values'].values.tolist() 
-    x_line_list = flatten_list(list_of_lists_x)
-    y_line_list = flatten_list(list_of_lists_y)
-    list_of_last_x = df_last['pedestrians_count'].values.tolist()
-    list_of_previous_x = df_prev['pedestrians_count'].values.tolist()
-    list_months = df_last['month'].values.tolist()
+    # one line per month through the points of all periods
+    x_line_list, y_line_list = connector_arrays(comparison)
+    period_names = [period_name(period) for period in periods]
+    colors = [PERIOD_COLORS[i % len(PERIOD_COLORS)] for i in range(len(periods) - 1)] + [COLOR_PALETTE[3]]
  
     
     fig = go.Figure(
@@ -387,49 +494,29 @@ def make_dumb_bell():
                 
             )
         ), 
-         
-        go.Scatter(
-            x=list_of_previous_x,
-            y=list_months,
-            mode="markers",
-            name=" ",
-            hovertemplate='%{y} (from previous 12 months) <br> pedestrians detected is %{x}',
-            showlegend=True,
-            marker=dict(
-                color=COLOR_PALETTE[0],
-                size=10
-            )   
-        ),
+        ] + [
         
         go.Scatter(
-            x=list_of_last_x,
-            y=list_months,
+            x=totals,
+            y=comparison.labels,
             mode="markers",
             name=" ",
-            hovertemplate='%{y} (from last 12 months) <br> pedestrians detected is %{x}',
+            hovertemplate=f'%{{y}} (from {name}) <br> pedestrians detected is %{{x}}',
             showlegend=True,
             marker=dict(
-                color=COLOR_PALETTE[3],
+                color=color,
                 size=10
-            )
-            
-        ),
-        
-       
+            )   
+        )
+        for totals, name, color in zip(comparison.totals, period_names, colors)
         ]
     )
     
-    fig.add_annotation(xref='paper', x=0.26, yref='paper', y=0.95,
-                           xanchor='left', yanchor='middle',
-                           text='Previous 12 months',
-                           font=dict(family="Open Sans",
-                                     color=COLOR_PALETTE[0],
-                                     size=16),
-                           showarrow=False)
-    
-    fig.add_annotation(xref='paper', x=0.63, yref='paper', y=0.95,
+    # the period names above the plot, spread between the positions used for two periods
+    for name, x in zip(period_names, np.linspace(0.26, 0.63, len(periods)) if len(periods) > 1 else [0.45]):
+        fig.add_annotation(xref='paper', x=x, yref='paper', y=0.95,
                            xanchor='left', yanchor='middle',
-                           text='Last 12 months',
+                           text=name[0].upper() + name[1:],
                            font=dict(family="Open Sans",
                                      color=COLOR_PALETTE[0],
                                      size=16),
@@ -462,7 +549,7 @@ def make_dumb_bell():
 
 
 
-def make_fig_3():
+def make_fig_3(data_manager):
     df = data_manager.count_by_day_last_year().reset_index().reset_index()
 
   
@@ -491,68 +578,76 @@ def make_fig_3():
         yaxis_tickformat = '.3s'
     )    
         
-    # add labels to plot
-    fig.add_annotation(xref='paper', x=0.54, yref='paper', y=0.48,
+    # label the peaks found in the daily counts at their data point, named after the event
+    # calendar where they match a known event
+    for event in data_manager.events().itertuples():
+        label = event.name if event.name else f"{event.date:%d %B}"
+        fig.add_annotation(xref='x', x=event.date, yref='y', y=event.pedestrians_count,
                            xanchor='left', yanchor='middle',
-                           text='  Sächsilüüte',
+                           text=f'   {label}',
                            font=dict(family="Open Sans",
                                      color=COLOR_PALETTE[1],
                                      size=16),
                            showarrow=False)
 
-    
-    fig.add_annotation(xref='paper', x=0.86, yref='paper', y=0.89,
-                           xanchor='left', yanchor='middle',
-                           text='   Street Parade',
-                           font=dict(family="Open Sans",
-                                     color=COLOR_PALETTE[1],
-                                     size=16),
-                           showarrow=False)
-    
-    
-    fig.add_annotation(xref='paper', x=0.76, yref='paper', y=0.97,
-                           xanchor='left', yanchor='middle',
-                           text='   Züri Fäscht',
-                           font=dict(family="Open Sans",
-                                     color=COLOR_PALETTE[1],
-                                     size=16),
-                           showarrow=False)
-    
     fig.update_xaxes(title_text='Date',tickangle=45)
     fig.update_yaxes(title_text='Pedestrian count')
 
     return fig
 
 
-def make_violin():
-    df =  data_manager.count_by_day_last_year().reset_index()
+def make_violin(data_manager, server_side=True):
+    # server_side: the densities of each weekday come from DataManager.day_densities() and are
+    # drawn as filled shapes, otherwise every daily row goes to px.violin
+    busiest_day = data_manager.summary().busiest_day
+    colors = {day: COLOR_PALETTE[3] if day == busiest_day else COLOR_PALETTE[0] for day in DAYS}
+    densities = data_manager.day_densities()
+    medians = densities.quantiles[:, 1]
+
+    if server_side:
+        fig = go.Figure()
+        # the widest curve is 0.8 categories wide. The outlines are sent with whole counts and
+        # widths to 1/1000 of a category, which keeps the figure smaller than px.violin's.
+        widest = np.nanmax(densities.density, initial=0)
+        scale = 0.4 / widest if widest > 0 else 0
+        for position, day in enumerate(DAYS):
+            inside = ~np.isnan(densities.density[position])
+            width = densities.density[position][inside] * scale
+            grid = np.rint(densities.grid[inside]).astype('int64')
+            fig.add_trace(go.Scatter(x=np.round(np.concatenate([position - width, position + width[::-1]]), 3),
+                                     y=np.concatenate([grid, grid[::-1]]),
+                                     fill='toself', fillcolor=colors[day], mode='lines',
+                                     line=dict(color=colors[day], width=1), opacity=0.6,
+                                     hoverinfo='skip', name=day))
+
+        fig.add_trace(go.Scatter(x=list(range(len(DAYS))), y=medians, mode='markers',
+                                 marker=dict(symbol='line-ew-open', size=40, color=COLOR_PALETTE[1],
+                                             line=dict(width=2)),
+                                 customdata=np.column_stack([DAYS, densities.quantiles[:, 0],
+                                                             densities.quantiles[:, 2], densities.days]),
+                                 hovertemplate='%{customdata[0]} <br> median pedestrians detected is %{y:.3s}'
+                                               '<br> half of the %{customdata[3]} days between %{customdata[1]:.3s}'
+                                               ' and %{customdata[2]:.3s}<extra></extra>'))
+        fig.update_xaxes(tickvals=list(range(len(DAYS))), ticktext=DAYS)
+    else:
+        df = px_frame(data_manager.count_by_day_last_year())
     
-    LOG.debug("make_violin() - df: ")
-    LOG.debug(df.head())
+        LOG.debug("make_violin() - df: ")
+        LOG.debug(df.head())
 
+        fig = px.violin(df, y="pedestrians_count", x="day", box=False, 
+                          color="day",
+                          color_discrete_map=colors,
+              hover_data=df.columns)
     
-    fig = px.violin(df, y="pedestrians_count", x="day", box=False, 
-                      color="day",
-                      color_discrete_map={'Monday': COLOR_PALETTE[0],
-                                          'Tuesday': COLOR_PALETTE[0],
-                                          "Wednesday": COLOR_PALETTE[0],
-                                          "Thursday": COLOR_PALETTE[0],
-                                          "Friday": COLOR_PALETTE[0],
-                                          "Saturday": COLOR_PALETTE[3],
-                                          "Sunday": COLOR_PALETTE[0],                                          
-                                          },   
-          hover_data=df.columns)
-    
-    
-    fig.update_xaxes(categoryorder='array', categoryarray= ['Monday','Tuesday','Wednesday','Thursday', 'Friday','Saturday','Sunday'])
+        fig.update_xaxes(categoryorder='array', categoryarray=DAYS)
 
+        fig.update_traces(meanline_visible=True)
     
-    fig.update_traces(meanline_visible=True)
-    
-    fig.update_traces(hovertemplate='%{y} <br> pedestrians detected in %{x}')
+        fig.update_traces(hovertemplate='%{y} <br> pedestrians detected in %{x}')
 
     fig.update_layout(margin=dict(l=150, r=180, t=100, b=50))
-    fig.update_layout(title="Saturday had more pedestrians."),
+    fig.update_layout(title=f"{busiest_day} had more pedestrians."),
     fig.update_layout(title_x=0.45, title_y=.95, title_xanchor='center', title_yanchor='top')
 
     fig.update_layout(showlegend=False, plot_bgcolor='white',
@@ -599,7 +694,8 @@ def make_violin():
     
     fig.update_layout(hovermode="closest") 
     
-    fig.add_annotation(x='Friday', y=65000,
+    # the shapes are drawn on positions, px.violin on day names
+    fig.add_annotation(x=DAYS.index('Friday') if server_side else 'Friday', y=medians[DAYS.index('Friday')],
             text="median ",
             xanchor="right",
             yanchor="bottom",
@@ -612,16 +708,18 @@ def make_violin():
     return fig
 
 
-def make_sunburst():
-    df = data_manager.location_day_time_last_year().reset_index()
-    
-    fig = px.sunburst(df, path=['location_name','day','time_of_day'], values='pedestrians_count', width=800, height=800,
-                      color="location_name",
-                      color_discrete_map={"Bahnhofstrasse (Süd)": COLOR_PALETTE[3],
-                                          "Bahnhofstrasse (Nord)": COLOR_PALETTE[3],
-                                          "Bahnhofstrasse (Mitte)": COLOR_PALETTE[3]
-                                          },
-                      range_color=[0, 10])
+def make_sunburst(data_manager, dims=('location_name', 'day', 'time_of_day')):
+    # the node arrays come from DataManager.hierarchy(), deeper hierarchies (e.g. location,
+    # month, day, hour) cost no more to build
+    hierarchy = data_manager.hierarchy(dims)
+    colors = location_colors(data_manager, other=COLOR_PALETTE[3])
+    # every node has the colour of its location, the first part of its id
+    node_colors = [colors.get(node.split('/', 1)[0], COLOR_PALETTE[3]) for node in hierarchy.ids]
+
+    fig = go.Figure(go.Sunburst(ids=hierarchy.ids, labels=hierarchy.labels, parents=hierarchy.parents,
+                                values=hierarchy.values, branchvalues='total',
+                                marker=dict(colors=node_colors)))
+    fig.update_layout(width=800, height=800)
 
     fig.update_traces(textinfo="label+percent parent")
     fig.update_traces(textfont=dict(family="Open Sans", color=COLOR_PALETTE[1]), selector=dict(type='sunburst'))
@@ -676,6 +774,36 @@ def make_sunburst():
     return fig
 
 
+@app.callback(
+    Output("fig_5", "figure"), [Input("heatmap_location", "value"),
+                                Input("heatmap_count_radio", "value"),
+                                Input("url", "pathname")]
+)
+def update_fig_5(location, count, pathname):
+    data_manager = data_sources.current(dataset_id(pathname)).data_manager
+    return make_week_heatmap(data_manager, location, count)
+
+
+def make_week_heatmap(data_manager, location=ALL_LOCATIONS, count='both'):
+    # hour of week x ISO week, accumulated from the cube by DataManager.week_heatmap()
+    location = location if location in counted_locations(data_manager) else None
+    df = data_manager.week_heatmap(location=location, column=COUNT_COLUMNS.get(count, 'pedestrians_count'))
+    hours = [f"{day[:3]} {hour:02d}:00" for day in DAYS for hour in range(24)]
+
+    fig = go.Figure(go.Heatmap(z=df.values, x=list(df.columns), y=hours,
+                               colorscale=[[0, 'white'], [0.5, COLOR_PALETTE[2]], [1, COLOR_PALETTE[3]]],
+                               hovertemplate='%{y}, %{x} <br> pedestrians detected is %{z}<extra></extra>',
+                               hoverongaps=False))
+
+    fig = default_fig_layout(fig)
+    fig.update_layout(width=900, height=900, margin=dict(l=120, r=50, t=50, b=100))
+    # Monday 00:00 at the top, one tick per day
+    fig.update_yaxes(autorange='reversed', tickvals=hours[::24], title_text='Hour of week')
+    fig.update_xaxes(title_text='Week', showline=False)
+
+    return fig
+
+
 def make_map():
     fig = go.Figure(go.Scattermapbox(
         mode = "markers",
@@ -804,538 +932,606 @@ Layout of the HTML page
 '''
 
 
-card_3 = dbc.Card(
-    [
-        dbc.CardBody(html.Div([
-            html.Span(["Saturday"], className="summary-graphic"),
-            "  was the most popular day with pedestrians on Bahnhofstrasse in the last 12 months"],
-            className="summary-text")
-        )
-    ],className="summary-text, summary-card"
-)
+def ratio_text(ratio):
+    # e.g. 1.87 -> ("almost ", "twice")
+    for factor, word in ((2, 'twice'), (3, 'three times')):
+        if factor * 0.9 <= ratio < factor:
+            return "almost ", word
+        if factor <= ratio < factor * 1.1:
+            return "", word
+    return "", f"{ratio:.1f} times"
 
-card_1 = dbc.Card(
-    [
-        dbc.CardBody(html.Div(["Bahnhofstrasse (Mitte) had almost ",
-            html.Span(["twice"], className="summary-graphic"),
-            "  as many pedestrians as Bahnhofstrasse (Süd) in the last 12 months"], className="summary-text")
-        )
-    ],className="summary-text, summary-card"
-)
 
-card_4 = dbc.Card(
-    [
-        dbc.CardBody(html.Div([
-            html.Span(["Afternoons"], className="summary-graphic"),
-            "  were consistently most popular with pedestrians in the last 12 months",
-        ], className="summary-text")
-        )
-    ],className="summary-text, summary-card"
-)
+def summary_card(children):
+    return dbc.Card(
+        [
+            dbc.CardBody(html.Div(children, className="summary-text"))
+        ],className="summary-text, summary-card"
+    )
 
-card_2 = dbc.Card(
-    [
-        dbc.CardBody(html.Div([ "The last 12 months had ",
-            html.Span(["more"], className="summary-graphic"),
-            "  pedestrians than in the previous 12 months", ], className="summary-text")
-        )
-    ],className="summary-text, summary-card"
-)
 
+def make_summary_cards(summary):
+    # the key points, from the facts of DataManager.summary()
+    # with a single location there is no ratio, without counts a year earlier no change
+    busiest, second = (list(summary.location_totals.index) + [None])[:2]
+    if np.isnan(summary.ratio):
+        card_1 = summary_card([
+            html.Span([busiest], className="summary-graphic"),
+            "  was the only section with pedestrians counted in the last 12 months"])
+    else:
+        qualifier, ratio = ratio_text(summary.ratio)
+        card_1 = summary_card([f"{busiest} had {qualifier}",
+            html.Span([ratio], className="summary-graphic"),
+            f"  as many pedestrians as {second} in the last 12 months"])
+
+    if np.isnan(summary.change):
+        card_2 = summary_card(["There are ",
+            html.Span(["no counts"], className="summary-graphic"),
+            "  from the previous 12 months to compare the last 12 months with"])
+    else:
+        card_2 = summary_card([ "The last 12 months had ",
+            html.Span(["more" if summary.change >= 0 else "fewer"], className="summary-graphic"),
+            f"  pedestrians ({summary.change:+.1f}%) than in the previous 12 months"])
 
+    card_3 = summary_card([
+        html.Span([summary.busiest_day], className="summary-graphic"),
+        "  was the most popular day with pedestrians on Bahnhofstrasse in the last 12 months"])
 
-#Actual Page layout
+    card_4 = summary_card([
+        html.Span([f"{summary.busiest_time_of_day}s"], className="summary-graphic"),
+        "  were {}most popular with pedestrians in the last 12 months".format(
+            "consistently " if summary.time_of_day_share == 1 else ""),
+        ])
 
-app.layout = html.Div([
-    dbc.Row(
-        [
+    return card_1, card_2, card_3, card_4
 
-            dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
-                              html.Div([
-                                  "13.5 Million pedestrians were counted on Zurich's Bahnhofstrasse (Mitte)",
-                                  html.Br(),
-                                  " in the last 12 months"], className="t1-heading")
-                              ], className="container-fluid", style={'text-align': 'center'}),
-                    width={'size': 12, "offset": 0, 'order': 1}),
-        ]
-    ),
+
+def headline_text(summary):
+    # e.g. "13.5 Million pedestrians were counted on Zurich's Bahnhofstrasse (Mitte)"
+    location = summary.location_totals.index[0]
+    return f"{summary.location_totals.iloc[0] / 1e6:.1f} Million pedestrians were counted on Zurich's {location}"
+
+
+
+#Actual Page layout
+
+def make_layout(data_manager):
+    summary = data_manager.summary()
+    card_1, card_2, card_3, card_4 = make_summary_cards(summary)
+    return html.Div([
+        dbc.Row(
+            [
+
+                dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
+                                  html.Div([
+                                      headline_text(summary),
+                                      html.Br(),
+                                      " in the last 12 months"], className="t1-heading")
+                                  ], className="container-fluid", style={'text-align': 'center'}),
+                        width={'size': 12, "offset": 0, 'order': 1}),
+            ]
+        ),
     
     
-    dbc.Row(
-        [
-            dbc.Col(html.Div([html.Br(), html.Br(), html.Br(),
-                              "As part of a joint pilot project involving the international real estate consulting company CBRE,",
-                              " the PropTech company hystreet.com, Swiss Life Asset Managers, Zurich Urban Development and  ",
-                              "the Zurich Bahnhofstrasse Association, Hystreet is collecting pedestrian frequencies on Bahnhofstrasse.",
-                              " Bahnhofstrasse has been segmented into sections and laser scanners are used to detect pedestrians in each section. The counts are updated on an hourly basis."
+        dbc.Row(
+            [
+                dbc.Col(html.Div([html.Br(), html.Br(), html.Br(),
+                                  "As part of a joint pilot project involving the international real estate consulting company CBRE,",
+                                  " the PropTech company hystreet.com, Swiss Life Asset Managers, Zurich Urban Development and  ",
+                                  "the Zurich Bahnhofstrasse Association, Hystreet is collecting pedestrian frequencies on Bahnhofstrasse.",
+                                  " Bahnhofstrasse has been segmented into sections and laser scanners are used to detect pedestrians in each section. The counts are updated on an hourly basis."
 
-                              ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
+                                  ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
 
-        ]
-    ),
+            ]
+        ),
     
-    dbc.Row(
-        [
+        dbc.Row(
+            [
 
-            dbc.Col(html.Div([html.Br(), html.Br(),
-                              "In the last 12 months, how many pedestrians were counted in each Bahnhofstrasse section?",
-                              ], className="my-subtitle", style={'text-align': 'center'}),
-                    width={'size': 12, "offset": 0}),
+                dbc.Col(html.Div([html.Br(), html.Br(),
+                                  "In the last 12 months, how many pedestrians were counted in each Bahnhofstrasse section?",
+                                  ], className="my-subtitle", style={'text-align': 'center'}),
+                        width={'size': 12, "offset": 0}),
 
-        ]
-    ),
-    dbc.Row(
-        [html.Div([html.Br(), html.Br()])
-         ]),
+            ]
+        ),
+        dbc.Row(
+            [html.Div([html.Br(), html.Br()])
+             ]),
     
-    dbc.Row(
-        [
+        dbc.Row(
+            [
 
-            dbc.Col(dcc.Graph(id='fig_0_5', figure=make_fig_detections_by_location(), config={
-                'displayModeBar': False
-            }),
-                    width=6, lg={'size': 5, "offset": 0, 'order': 1}
-                    ),
-            dbc.Col(html.Div([
-                html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), 
-                html.Span(["Hint: "], className="explain-title"),
-                ("Hover over graphs for details"),
-                html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
-                html.Span(["Last 12 months: "], className="explain-title"),
-                ("1st October 2022 until 30th September 2023"),
-            ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
-        ]
-    ),
+                dbc.Col(dcc.Graph(id='fig_0_5', figure=make_fig_detections_by_location(data_manager), config={
+                    'displayModeBar': False
+                }),
+                        width=6, lg={'size': 5, "offset": 0, 'order': 1}
+                        ),
+                dbc.Col(html.Div([
+                    html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), 
+                    html.Span(["Hint: "], className="explain-title"),
+                    ("Hover over graphs for details"),
+                    html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
+                    html.Span(["Last 12 months: "], className="explain-title"),
+                    (period_text(data_manager, 'last_year', 'until')),
+                ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
+            ]
+        ),
     
-    dbc.Row(
-        [
+        dbc.Row(
+            [
 
-            dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
-                              "Where exactly is Bahnhofstrasse (Mitte) located?",
-                              ], className="my-subtitle", style={'text-align': 'center'}),
-                    width={'size': 12, "offset": 0, 'order': 1}),
+                dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
+                                  "Where exactly is Bahnhofstrasse (Mitte) located?",
+                                  ], className="my-subtitle", style={'text-align': 'center'}),
+                        width={'size': 12, "offset": 0, 'order': 1}),
 
-        ]
-    ),
-    dbc.Row(
-        [
-            dbc.Col(html.Div([html.Br(), html.Br(), html.Br(),
-                              " This visualization uses data from Bahnhofstrasse (Mitte) and (Süd): ",
-                              " data for Bahnhofstrasse (Nord) is incomplete." 
+            ]
+        ),
+        dbc.Row(
+            [
+                dbc.Col(html.Div([html.Br(), html.Br(), html.Br(),
+                                  " This visualization uses data from Bahnhofstrasse (Mitte) and (Süd): ",
+                                  " data for Bahnhofstrasse (Nord) is incomplete." 
 
-                              ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
+                                  ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
 
-        ]
-    ),
-    dbc.Row(
-        [
-            dbc.Col(html.Div([html.Br(), html.Br(),
-                              ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
+            ]
+        ),
+        dbc.Row(
+            [
+                dbc.Col(html.Div([html.Br(), html.Br(),
+                                  ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
 
-        ]
-    ),
-    dbc.Row(
-        [
+            ]
+        ),
+        dbc.Row(
+            [
 
-            dbc.Col(dcc.Graph(id='fig_3_6', figure=make_map(), config={
-                'displayModeBar': False
-            }),
+                dbc.Col(dcc.Graph(id='fig_3_6', figure=make_map(), config={
+                    'displayModeBar': False
+                }),
                  
-                   width={"size": 6, "offset": 0, "order":1},
-                    ),
-            dbc.Col(html.Div([
-                html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
-                html.Span(["Hint: "], className="explain-title"),
-                ("Scroll over map to zoom in/out"),
-            ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
-
-        ]
-    ),
+                       width={"size": 6, "offset": 0, "order":1},
+                        ),
+                dbc.Col(html.Div([
+                    html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
+                    html.Span(["Hint: "], className="explain-title"),
+                    ("Scroll over map to zoom in/out"),
+                ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
+
+            ]
+        ),
     
-    dbc.Row(
-        [
+        dbc.Row(
+            [
 
-            dbc.Col(
-                    html.Div([
-                        html.Div([html.Br(), html.Br(),
-                              "In the last 12 months, how many pedestrians were counted each month?",
-                              ], className="my-subtitle", style={'text-align': 'center'}),
-                    
+                dbc.Col(
                         html.Div([
-                                      "(Bahnhofstrasse Süd and Mitte combined)",
-                                      ], className="container-fluid", style={'text-align': 'center'}),
-                    ], className="my-subtitle", style={'text-align': 'center'}),
+                            html.Div([html.Br(), html.Br(),
+                                  "In the last 12 months, how many pedestrians were counted each month?",
+                                  ], className="my-subtitle", style={'text-align': 'center'}),
+                    
+                            html.Div([
+                                          "(Bahnhofstrasse Süd and Mitte combined)",
+                                          ], className="container-fluid", style={'text-align': 'center'}),
+                        ], className="my-subtitle", style={'text-align': 'center'}),
                     
-                    width={'size': 12, "offset": 0}),
+                        width={'size': 12, "offset": 0}),
 
-        ]
-    ),
-    dbc.Row(
-        [html.Div([html.Br(), html.Br()])
-         ]),
-    dbc.Row(
-        [
+            ]
+        ),
+        dbc.Row(
+            [html.Div([html.Br(), html.Br()])
+             ]),
+        dbc.Row(
+            [
 
-            dbc.Col(html.Div([
+                dbc.Col(html.Div([
                 
-            ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
+                ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
 
-        ]
-    ),
+            ]
+        ),
     
     
-    dbc.Row(
-        [
+        dbc.Row(
+            [
 
-            dbc.Col(dcc.Graph(id='fig_1', figure=make_fig_detections_by_month(), config={
-                'displayModeBar': False
-            }),
-                    width=6, lg={'size': 5, "offset": 0, 'order': 1}
-                    ),
-            dbc.Col(html.Div([
-                html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
-                html.Span(["Hint: "], className="explain-title"),
-                ("Hover over graphs for details"),
-            ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
-        ]
-    ),
-    dbc.Row(
-        [html.Div([html.Br(), html.Br(), html.Br(), html.Br()])
-         ]),
-    dbc.Row(
-        [
+                dbc.Col(dcc.Graph(id='fig_1', figure=make_fig_detections_by_month(data_manager), config={
+                    'displayModeBar': False
+                }),
+                        width=6, lg={'size': 5, "offset": 0, 'order': 1}
+                        ),
+                dbc.Col(html.Div([
+                    html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
+                    html.Span(["Hint: "], className="explain-title"),
+                    ("Hover over graphs for details"),
+                ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
+            ]
+        ),
+        dbc.Row(
+            [html.Div([html.Br(), html.Br(), html.Br(), html.Br()])
+             ]),
+        dbc.Row(
+            [
            
-            dbc.Col(
+                dbc.Col(
                 
-            html.Div([
-                html.Div([html.Br(), html.Br(),
-                       "How does the last 12 month pedestrian counts compare to the previous 12 month counts?",
-                      ], className="my-subtitle", style={'text-align': 'center'}),
-            
                 html.Div([
-                              "(Bahnhofstrasse Süd and Mitte combined)",
-                              ], className="container-fluid", style={'text-align': 'center'}),
-            ], className="my-subtitle", style={'text-align': 'center'}),
+                    html.Div([html.Br(), html.Br(),
+                           "How does the last 12 month pedestrian counts compare to the previous 12 month counts?",
+                          ], className="my-subtitle", style={'text-align': 'center'}),
             
-            width={'size': 12, "offset": 0}),
+                    html.Div([
+                                  "(Bahnhofstrasse Süd and Mitte combined)",
+                                  ], className="container-fluid", style={'text-align': 'center'}),
+                ], className="my-subtitle", style={'text-align': 'center'}),
+            
+                width={'size': 12, "offset": 0}),
 
-        ]
-    ),
-    dbc.Row(
-        [
-            dbc.Col(html.Div([html.Br(), html.Br(),
-                              ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 2}),
-        ]
-    ),
-    dbc.Row(
-        [
+            ]
+        ),
+        dbc.Row(
+            [
+                dbc.Col(html.Div([html.Br(), html.Br(),
+                                  ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 2}),
+            ]
+        ),
+        dbc.Row(
+            [
 
-            dbc.Col(dcc.Graph(id='fig_2', figure=make_dumb_bell(), config={
-                'displayModeBar': False
-            }),
-                    width=6, lg={'size': 5, "offset": 0, 'order': 1}
-                    ),
-            dbc.Col(html.Div([
-                html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
-                html.Span(["Previous 12 months: "], className="explain-title"),
-                (" 1st October 2021 to 30th September 2022"),
-                html.Br(),html.Br(), html.Br(),
-                html.Span(["Last 12 months: "], className="explain-title"),
-                (" 1st October 2022 to 30th September 2023")
+                dbc.Col(dcc.Graph(id='fig_2', figure=make_dumb_bell(data_manager), config={
+                    'displayModeBar': False
+                }),
+                        width=6, lg={'size': 5, "offset": 0, 'order': 1}
+                        ),
+                dbc.Col(html.Div([
+                    html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
+                    html.Span(["Previous 12 months: "], className="explain-title"),
+                    (" " + period_text(data_manager, 'previous_year', 'to')),
+                    html.Br(),html.Br(), html.Br(),
+                    html.Span(["Last 12 months: "], className="explain-title"),
+                    (" " + period_text(data_manager, 'last_year', 'to'))
                
-            ], className="container-fluid"), width={'size': 2, "offset": 2, 'order': 0}),
-        ]
-    ),
-    dbc.Row(
-        [html.Div([html.Br(), html.Br(), html.Br(), html.Br()])
-         ]),
-    dbc.Row(
-        [
+                ], className="container-fluid"), width={'size': 2, "offset": 2, 'order': 0}),
+            ]
+        ),
+        dbc.Row(
+            [html.Div([html.Br(), html.Br(), html.Br(), html.Br()])
+             ]),
+        dbc.Row(
+            [
 
-            dbc.Col(
+                dbc.Col(
                 
-            html.Div([
-                html.Div([html.Br(), html.Br(),
-                       "In the last 12 months, how many pedestrians were counted per day?",
-                      ], className="my-subtitle", style={'text-align': 'center'}),
-            
                 html.Div([
-                              "(Bahnhofstrasse Süd and Mitte combined)",
-                              ], className="container-fluid", style={'text-align': 'center'}),
-            ], className="my-subtitle", style={'text-align': 'center'}),
+                    html.Div([html.Br(), html.Br(),
+                           "In the last 12 months, how many pedestrians were counted per day?",
+                          ], className="my-subtitle", style={'text-align': 'center'}),
             
-            width={'size': 12, "offset": 0}),
-
-        ]
-    ),
-    dbc.Row(
-        [
-            dbc.Col(html.Div([html.Br(), html.Br(),
-                              ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
+                    html.Div([
+                                  "(Bahnhofstrasse Süd and Mitte combined)",
+                                  ], className="container-fluid", style={'text-align': 'center'}),
+                ], className="my-subtitle", style={'text-align': 'center'}),
+            
+                width={'size': 12, "offset": 0}),
 
-        ]
-    ),
-    dbc.Row(
-        [
+            ]
+        ),
+        dbc.Row(
+            [
+                dbc.Col(html.Div([html.Br(), html.Br(),
+                                  ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
 
-            dbc.Col(
-                dcc.Graph(id='fig_3', figure=make_fig_3(), config={
-                    'displayModeBar': False
-                    })
-                , width=6, lg={'size': 8, "offset": 0, 'order': 1}
-            ),
-            dbc.Col(html.Div([
-                html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
-                html.Span(["Hint: "], className="explain-title"),
-                ("Hover over graphs for details"),
-            ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
+            ]
+        ),
+        dbc.Row(
+            [
+
+                dbc.Col(
+                    dcc.Graph(id='fig_3', figure=make_fig_3(data_manager), config={
+                        'displayModeBar': False
+                        })
+                    , width=6, lg={'size': 8, "offset": 0, 'order': 1}
+                ),
+                dbc.Col(html.Div([
+                    html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
+                    html.Span(["Hint: "], className="explain-title"),
+                    ("Hover over graphs for details"),
+                ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
 
-        ]
-    ),
+            ]
+        ),
 
-    dbc.Row(
-        [
+        dbc.Row(
+            [
 
-            dbc.Col(
+                dbc.Col(
                
-             html.Div([
-                 html.Div([html.Br(), html.Br(),
-                        "In the last 12 months, which day of the week was most popular with pedestrians?",
-                       ], className="my-subtitle", style={'text-align': 'center'}),
-             
                  html.Div([
-                               "(Bahnhofstrasse Süd and Mitte combined)",
-                               ], className="container-fluid", style={'text-align': 'center'}),
-             ], className="my-subtitle", style={'text-align': 'center'}),
+                     html.Div([html.Br(), html.Br(),
+                            "In the last 12 months, which day of the week was most popular with pedestrians?",
+                           ], className="my-subtitle", style={'text-align': 'center'}),
+             
+                     html.Div([
+                                   "(Bahnhofstrasse Süd and Mitte combined)",
+                                   ], className="container-fluid", style={'text-align': 'center'}),
+                 ], className="my-subtitle", style={'text-align': 'center'}),
              
-             width={'size': 12, "offset": 0,'order': 1}),
+                 width={'size': 12, "offset": 0,'order': 1}),
 
            
 
-        ]
-    ),
-    dbc.Row(
-        [
-            dbc.Col(html.Div([html.Br(), html.Br(),
-                              ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
-
-        ]
-    ),
-    dbc.Row(
-        [
+            ]
+        ),
+        dbc.Row(
+            [
+                dbc.Col(html.Div([html.Br(), html.Br(),
+                                  ], className="container-fluid"), width={'size': 4, "offset": 4, 'order': 1}),
 
-            dbc.Col(dcc.Graph(id='fig_3_5', figure=make_violin(), config={
-                'displayModeBar': False
-            }),
-                    width=6, lg={'size': 8, "offset": 0, 'order': 1}
-                    ),
+            ]
+        ),
+        dbc.Row(
+            [
 
-             dbc.Col(html.Div([
-                 html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
-                 html.Span(["Hint: "], className="explain-title"),
-                 ("Hover over graphs for details"),
-             ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
-        ]
-    ),
+                dbc.Col(dcc.Graph(id='fig_3_5', figure=make_violin(data_manager), config={
+                    'displayModeBar': False
+                }),
+                        width=6, lg={'size': 8, "offset": 0, 'order': 1}
+                        ),
+
+                 dbc.Col(html.Div([
+                     html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
+                     html.Span(["Hint: "], className="explain-title"),
+                     ("Hover over graphs for details"),
+                 ], className="hint-format"), width={'size': 2, "offset": 2, 'order': 0}),
+            ]
+        ),
    
         
 
-    dbc.Row(
-        [
+        dbc.Row(
+            [
 
-            dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
-                              "In the last 12 months, which day and 'times of day'",html.Br(),
-                              " had biggest portion of pedestrians?",
-                              ], className="my-subtitle", style={'text-align': 'center'}),
-                    width={'size': 12, "offset": 0, 'order': 1}),
+                dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
+                                  "In the last 12 months, which day and 'times of day'",html.Br(),
+                                  " had biggest portion of pedestrians?",
+                                  ], className="my-subtitle", style={'text-align': 'center'}),
+                        width={'size': 12, "offset": 0, 'order': 1}),
 
-        ]
-    ),
+            ]
+        ),
 
-    dbc.Row(
-        [
-            html.Div([html.Br(), html.Br()])
-        ]
-    ),
+        dbc.Row(
+            [
+                html.Div([html.Br(), html.Br()])
+            ]
+        ),
 
-    dbc.Row(
-        [
-        dbc.Col(html.Div([
+        dbc.Row(
+            [
+            dbc.Col(html.Div([
             
-                html.Br(), html.Br(),html.Br(),html.Br(),
-                html.Div([html.Span(["Hint: "], className="explain-title"),
-                ("Click on Inner Circle and Middle Ring to expand. Hover over plot segments to get actual pedestrian counts")], className="hint-format"),
-                html.Br(), html.Br(), html.Br(),
-                 html.Span(["Inner Circle: "], className="explain-title"),
-                ("Section of Bahnhofstrasse"),
-                html.Br(), html.Br(),
-                 html.Span(["Middle Ring: "], className="explain-title"),
-                ("Days of week"),
-                html.Br(), html.Br(),
-                 html.Span(["Outer Ring: "], className="explain-title"),
-                ("Time of day"),
-                 html.Br(),
+                    html.Br(), html.Br(),html.Br(),html.Br(),
+                    html.Div([html.Span(["Hint: "], className="explain-title"),
+                    ("Click on Inner Circle and Middle Ring to expand. Hover over plot segments to get actual pedestrian counts")], className="hint-format"),
+                    html.Br(), html.Br(), html.Br(),
+                     html.Span(["Inner Circle: "], className="explain-title"),
+                    ("Section of Bahnhofstrasse"),
+                    html.Br(), html.Br(),
+                     html.Span(["Middle Ring: "], className="explain-title"),
+                    ("Days of week"),
+                    html.Br(), html.Br(),
+                     html.Span(["Outer Ring: "], className="explain-title"),
+                    ("Time of day"),
+                     html.Br(),
              
                
-            ], className="container-fluid"), width={'size': 2, "offset": 1, 'order': 0}),
-
-            dbc.Col(dcc.Graph(id='fig_4', figure=make_sunburst(), config={
-                'displayModeBar': False
-            },
-                              style={
-                                  "padding-left": "200px",
-                              }
-                              ),
-                    width=6, lg={'size': 5, "offset": 0, 'order': 1}
-                    ),
-            
-        ]
-    ),
-    dbc.Row(
-        [
-            dbc.Col(
-                html.Div([html.Span(["Night: "], className="explain-title"),
-                          ("from 00:01 until 06:00"),
-                    ], className="container-fluid"), width={'size': 2, "offset": 3, 'order': 1}),
-            
-            dbc.Col(
-                html.Div([ html.Span(["Morning: "], className="explain-title"),
-                          ("from 06:01 until 12:00"),
-                    ], className="container-fluid"), width={'size': 2, "offset": 0, 'order': 2}),
-            
-            dbc.Col(
-                html.Div([ html.Span(["Afternoon: "], className="explain-title"),
-                (
-                    "from 12:01 until 18:00"),
-                    ], className="container-fluid"), width={'size': 2, "offset": 0, 'order': 3}),
+                ], className="container-fluid"), width={'size': 2, "offset": 1, 'order': 0}),
+
+                dbc.Col(dcc.Graph(id='fig_4', figure=make_sunburst(data_manager), config={
+                    'displayModeBar': False
+                },
+                                  style={
+                                      "padding-left": "200px",
+                                  }
+                                  ),
+                        width=6, lg={'size': 5, "offset": 0, 'order': 1}
+                        ),
             
-            dbc.Col(
-                html.Div([  html.Span(["Evening: "], className="explain-title"),
-                 ("from 18:01 until 24:00"),
-                    ], className="container-fluid"), width={'size': 2, "offset": 0, 'order': 4}),
-        ]),
+            ]
+        ),
+        dbc.Row(make_time_bucket_cols(DEFAULT_TIME_BUCKETS), id="time_bucket_texts"),
     
-    dbc.Row(
-        [
-            html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
-        ]),
-    dbc.Row(
-        [
-            dbc.Col(html.Div([
-                "In the last 12 months, what time was busiest in each month?",
-            ], className="my-subtitle", style={'text-align': 'center'}), width={'size': 12, "offset": 0, 'order': 1}),
-        ]
-    ),
-    dbc.Row(
-        [
-            html.Br(), html.Br(), html.Br(), html.Br(),
-        ]),
-    dbc.Row(
-        [
+        dbc.Row(
+            [
+                html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
+            ]),
+        dbc.Row(
+            [
+                dbc.Col(html.Div([
+                    "In the last 12 months, what time was busiest in each month?",
+                ], className="my-subtitle", style={'text-align': 'center'}), width={'size': 12, "offset": 0, 'order': 1}),
+            ]
+        ),
+        dbc.Row(
+            [
+                html.Br(), html.Br(), html.Br(), html.Br(),
+            ]),
+        dbc.Row(
+            [
            
-            dbc.Col(
+                dbc.Col(
                 
-                html.Div(
-                    [    
-                        html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
-                        html.Span(["Hint: "], className="explain-title"),
-                        ("Switch between locations and toggle between count of total/adult/child pedestrians"),
-                        html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
-                        html.Br(),
-                        dcc.RadioItems(
-                             options={
-                                 'both': ' Adults & Children',
-                                 'adults': ' Adults',
-                                 'children': ' Children'
-                                 },
-                             id="radio_button", value='both'
-                    )], className="container-fluid", style={'text-align': 'left', 'color':COLOR_PALETTE[1] }
-                         ), 
-                width={'size': 2, "offset": 2, 'order': 1}
+                    html.Div(
+                        [    
+                            html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),html.Br(), html.Br(),
+                            html.Span(["Hint: "], className="explain-title"),
+                            ("Switch between locations and toggle between count of total/adult/child pedestrians"),
+                            html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
+                            html.Br(),
+                            dcc.RadioItems(
+                                 options=COUNT_OPTIONS,
+                                 id="radio_button", value='both'
+                        ),
+                            html.Br(),
+                            dcc.RadioItems(options=TIME_BUCKET_OPTIONS, id="time_buckets_radio",
+                                           value=DEFAULT_TIME_BUCKETS)
+                        ], className="container-fluid", style={'text-align': 'left', 'color':COLOR_PALETTE[1] }
+                             ), 
+                    width={'size': 2, "offset": 2, 'order': 1}
                 
-            ),
+                ),
            
            
            
-            dbc.Col(html.Div([
-                breakdown_card
-            ],className="container-fluid", style={'text-align': 'center'}), width={'size': 5, "offset": 0, 'order': 2}),
+                dbc.Col(html.Div([
+                    make_breakdown_card(data_manager)
+                ],className="container-fluid", style={'text-align': 'center'}), width={'size': 5, "offset": 0, 'order': 2}),
 
-        ]
+            ]
+                    ),
+
+        dbc.Row(
+            [
+                html.Br(), html.Br(), html.Br(), html.Br(),
+            ]),
+
+        dbc.Row(
+            [
+                dbc.Col(html.Div([
+                    "In the last 12 months, which hours of the week were busiest?",
+                ], className="my-subtitle", style={'text-align': 'center'}), width={'size': 12, "offset": 0, 'order': 1}),
+            ]
+        ),
+        dbc.Row(
+            [
+                html.Br(), html.Br(), html.Br(), html.Br(),
+            ]),
+        dbc.Row(
+            [
+                dbc.Col(
+                    html.Div(
+                        [
+                            html.Br(), html.Br(), html.Br(), html.Br(), html.Br(),
+                            html.Span(["Hint: "], className="explain-title"),
+                            ("Choose a section and toggle between count of total/adult/child pedestrians"),
+                            html.Br(), html.Br(), html.Br(),
+                            dcc.Dropdown(options=[{'label': 'All sections', 'value': ALL_LOCATIONS}]
+                                                 + [{'label': location, 'value': location}
+                                                    for location in counted_locations(data_manager)],
+                                         id="heatmap_location", value=ALL_LOCATIONS, clearable=False),
+                            html.Br(),
+                            dcc.RadioItems(options=COUNT_OPTIONS, id="heatmap_count_radio", value='both')
+                        ], className="container-fluid", style={'text-align': 'left', 'color':COLOR_PALETTE[1] }
+                             ),
+                    width={'size': 2, "offset": 1, 'order': 1}
                 ),
 
-    dbc.Row(
-        [
-            html.Br(), html.Br(), html.Br(), html.Br(),
-        ]),
+                dbc.Col(dcc.Graph(id='fig_5', figure=make_week_heatmap(data_manager), config={
+                    'displayModeBar': False
+                }),
+                        width=6, lg={'size': 8, "offset": 0, 'order': 2}
+                        ),
+            ]
+        ),
 
-    dbc.Row(
-        [
-            dbc.Col(html.Div([
-                "Key Points",
-            ], className="my-subtitle", style={'text-align': 'center'}), width={'size': 12, "offset": 0, 'order': 1}),
-        ]
-    ),
-    dbc.Row(
-        [
-            html.Br(), html.Br(),
-        ]),
+        dbc.Row(
+            [
+                html.Br(), html.Br(), html.Br(), html.Br(),
+            ]),
+
+        dbc.Row(
+            [
+                dbc.Col(html.Div([
+                    "Key Points",
+                ], className="my-subtitle", style={'text-align': 'center'}), width={'size': 12, "offset": 0, 'order': 1}),
+            ]
+        ),
+        dbc.Row(
+            [
+                html.Br(), html.Br(),
+            ]),
     
-     dbc.Row(
-         [
-             dbc.Col(
-                 card_1,
-                 width={'size': 6, "offset": 3, 'order': 0}),
-             html.Br(), html.Br(),
-
-         ]
-     ),
-     dbc.Row(
-         [
-             dbc.Col(
-                 card_2, 
-                 width={'size': 6, "offset": 3, 'order': 0}),
-             html.Br(), html.Br(),
-
-         ]
-     ),
-     dbc.Row(
-         [
-             dbc.Col(
-                 card_3, 
-                 width={'size': 6, "offset": 3, 'order': 0}),
-             html.Br(), html.Br(),
+         dbc.Row(
+             [
+                 dbc.Col(
+                     card_1,
+                     width={'size': 6, "offset": 3, 'order': 0}),
+                 html.Br(), html.Br(),
+
+             ]
+         ),
+         dbc.Row(
+             [
+                 dbc.Col(
+                     card_2, 
+                     width={'size': 6, "offset": 3, 'order': 0}),
+                 html.Br(), html.Br(),
+
+             ]
+         ),
+         dbc.Row(
+             [
+                 dbc.Col(
+                     card_3, 
+                     width={'size': 6, "offset": 3, 'order': 0}),
+                 html.Br(), html.Br(),
              
-         ]
-     ),
-     dbc.Row(
-         [
-             dbc.Col(
-                 card_4, 
-                 width={'size': 6, "offset": 3, 'order': 0}),
-             html.Br(), html.Br(),
+             ]
+         ),
+         dbc.Row(
+             [
+                 dbc.Col(
+                     card_4, 
+                     width={'size': 6, "offset": 3, 'order': 0}),
+                 html.Br(), html.Br(),
              
              
-         ]
-     ),
-
-    dbc.Row(
-        [
-            dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
-                              html.A("Source: opendata.swiss - Passantenfrequenzen an der Bahnhofstrasse - Stundenwerte", 
-                                     href='https://opendata.swiss/de/dataset/passantenfrequenzen-an-der-bahnhofstrasse-stundenwerte ', target="_blank",
-                                     className="container-fluid"),
-                              #])        
-                              html.Br(),
-                              html.Br(),
-                              ]
-                             ), width={'size': 4, "offset": 4, 'order': 2}
-                    )
-        ]
+             ]
+         ),
+
+        dbc.Row(
+            [
+                dbc.Col(html.Div([html.Br(), html.Br(), html.Br(), html.Br(),
+                                  html.A("Source: opendata.swiss - Passantenfrequenzen an der Bahnhofstrasse - Stundenwerte", 
+                                         href='https://opendata.swiss/de/dataset/passantenfrequenzen-an-der-bahnhofstrasse-stundenwerte ', target="_blank",
+                                         className="container-fluid"),
+                                  #])        
+                                  html.Br(),
+                                  html.Br(),
+                                  ]
+                                 ), width={'size': 4, "offset": 4, 'order': 2}
+                        )
+            ]
+        )
+    ],
+        className="dbc"
     )
-],
-    className="dbc"
-)
+
+
+def build_snapshot(data_manager):
+    # the layout is built together with the data, so swapping in a new snapshot never
+    # leaves a request waiting on figures being built
+    return Snapshot(data_manager, make_layout(data_manager))
+
+
+@app.callback(Output("page", "children"), [Input("url", "pathname")])
+def update_page(pathname):
+    selected = dataset_id(pathname)
+    if selected not in DATASETS:
+        return html.Div(f"Unknown dataset: {selected}", className="t1-heading")
+    return data_sources.current(selected).layout
+
+
+data_sources = DatasetRegistry(max_open=MAX_OPEN_DATASETS, build=build_snapshot,
+                               interval=RELOAD_INTERVAL_SECONDS, shared=SHARED_DATA)
+# the default dataset is loaded up front, the others on their first request
+data_sources.get(DEFAULT_DATASET)
+
+app.layout = html.Div([dcc.Location(id="url"), html.Div(id="page")])
 
 if __name__ == '__main__':
     #app.run_server(debug=True)
@@ -0,0 +1,48 @@
+import sys
+import timeit
+
+import pandas as pd
+
+from DataHelper import DataManager, DEFAULT_FILE_NAME
+
+# Times the integer-coded group-by kernel (DataManager query methods) against the pandas
+# groupby versions they replaced, on the last 12 months of a source file:
+#
+#   python3 Benchmark.py [csv file]
+
+PANDAS_QUERIES = {
+    'location_date_time': lambda df: df.groupby(["month", 'time_of_day', 'location_name'], observed=True).agg(
+        {"pedestrians_count": "sum", "adult_pedestrians_count": 'sum', 'child_pedestrians_count': 'sum',
+         "month_year": 'first'}),
+    'count_by_month': lambda df: df.groupby(['month'], observed=True).agg(
+        {'pedestrians_count': 'sum', "month_year": 'first'}),
+    'count_by_day': lambda df: df.groupby(['date'], observed=True).agg(
+        {'pedestrians_count': 'sum', 'day': 'first', 'month': 'first', "month_year": 'first'}),
+    'location_day_time': lambda df: df.groupby(["day", 'time_of_day', 'location_name'], observed=True).agg(
+        {"pedestrians_count": "sum"}),
+    'count_by_location': lambda df: df.groupby(['location_name'], observed=True).agg(
+        {'pedestrians_count': 'sum'}),
+}
+
+
+def best_of(function, repeat=7, number=20):
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number
+
+
+def run(file_name):
+    data_manager = DataManager(file_name, use_cache=False)
+    df = data_manager.DF_LAST_YEAR
+    print(f"{len(df)} rows")
+    print(f"{'query':<20} {'pandas ms':>10} {'kernel ms':>10} {'speedup':>8}")
+
+    for method, pandas_query in PANDAS_QUERIES.items():
+        query = getattr(data_manager, method)
+        pd.testing.assert_frame_equal(query(df), pandas_query(df), check_dtype=False)
+
+        pandas_time = best_of(lambda: pandas_query(df))
+        kernel_time = best_of(lambda: query(df))
+        print(f"{method:<20} {pandas_time * 1e3:>10.2f} {kernel_time * 1e3:>10.2f} {pandas_time / kernel_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    run(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_FILE_NAME)
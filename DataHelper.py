@@ -5,84 +5,1777 @@ Created on Fri Oct 20 22:25:27 2023
 
 @author: pfox
 """
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+LOG = logging.getLogger("Bahnhofstrasse_vis.DataHelper")
+
+DEFAULT_FILE_NAME = 'data/hystreet_fussgaengerfrequenzen_seit2021.csv'
+
+# dataset id -> hystreet export, further streets/cities are served by adding them here
+DEFAULT_DATASET = 'bahnhofstrasse'
+DATASETS = {DEFAULT_DATASET: DEFAULT_FILE_NAME}
+
+# bump whenever prepare_frame() changes the prepared columns, so old sidecars are rebuilt
+CACHE_VERSION = 8
+CACHE_METADATA_KEY = b'bahnhofstrasse_cache'
+
+# bump whenever the computed DataManager state changes, so old state files are ignored
+STATE_VERSION = 7
+
+HOURS_PER_WEEK = 7 * 24
+
+# optional calendar of known local events (start,end,name with inclusive dates), the detected
+# peaks of the daily counts are named after them
+EVENTS_FILE_NAME = 'data/events.csv'
+
+# query results memoized per DataManager, the least recently used ones are dropped first
+MEMO_SIZE = 128
+
+# the queries behind the dashboard, computed up front and kept in the state file
+WARM_QUERIES = [('location_date_time', 'last_year'),
+                ('count_by_month', 'last_year'),
+                ('count_by_month', 'previous_year'),
+                ('count_by_day', 'last_year'),
+                ('location_day_time', 'last_year'),
+                ('count_by_location', 'last_year')]
+
+# the queries as group keys, summed counts and the fields taken from the first row of each
+# group, computed by aggregate_frame() for a frame and by the RollupCube for the periods
+ROLLUPS = {
+    'location_date_time': (['month', 'time_of_day', 'location_name'],
+                           ['pedestrians_count', 'adult_pedestrians_count', 'child_pedestrians_count'],
+                           ['month_year']),
+    'count_by_month': (['month'], ['pedestrians_count'], ['month_year']),
+    'count_by_day': (['date'], ['pedestrians_count'], ['day', 'month', 'month_year']),
+    'location_day_time': (['day', 'time_of_day', 'location_name'], ['pedestrians_count'], []),
+    'count_by_location': (['location_name'], ['pedestrians_count'], []),
+}
+
+# bad counts are read as NaN / negative values (float32 holds every count exactly) and left to
+# validate_frame(), valid ones are downcast to unsigned ints by prepare_frame()
+# only these csv columns are used, everything else in the export is skipped while reading
+SOURCE_COLUMNS = ['location_name', 'timestamp', 'pedestrians_count',
+                  'adult_pedestrians_count', 'child_pedestrians_count']
+SOURCE_DTYPES = {'location_name': 'category',
+                 'timestamp': 'str',
+                 'pedestrians_count': 'float32',
+                 'adult_pedestrians_count': 'float32',
+                 'child_pedestrians_count': 'float32'}
+
+# calendar fields (hour, day, date, month, ...) and the periods follow Zurich local time
+LOCAL_TZ = 'Europe/Zurich'
+
+#Nord data is incomplete.
+EXCLUDED_LOCATIONS = ['Bahnhofstrasse (Nord)']
+
+
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
+
+# time of day buckets: the hours the buckets start at and their labels, an hour belongs to the
+# last bucket starting at or before it. A label can be used for more than one bucket, e.g. the
+# hours before and after the shops are open.
+TIME_BUCKETS = {
+    'quarters': ((0, 6, 12, 18), ('Night', 'Morning', 'Afternoon', 'Evening')),
+    'opening_hours': ((0, 9, 12, 14, 20), ('Closed', 'Morning', 'Lunch', 'Afternoon', 'Closed')),
+}
+DEFAULT_TIME_BUCKETS = 'quarters'
+
+
+@lru_cache(maxsize=None)
+def time_buckets(buckets=DEFAULT_TIME_BUCKETS):
+    # hour -> label code lookup table and the distinct labels of a TIME_BUCKETS name or of a
+    # (boundaries, labels) pair of tuples, built once per configuration
+    boundaries, labels = TIME_BUCKETS.get(buckets, buckets)
+    if (len(boundaries) != len(labels) or not boundaries or boundaries[0] != 0 or boundaries[-1] > 23
+            or list(boundaries) != sorted(set(boundaries))):
+        raise ValueError(f"invalid time buckets {buckets!r}: boundaries have to be increasing hours "
+                         "starting at 0, one label each")
+
+    categories = list(dict.fromkeys(labels))
+    bucket = np.searchsorted(boundaries, np.arange(24), side='right') - 1
+    codes = np.array([categories.index(label) for label in labels], dtype='int8')[bucket]
+    return codes, categories
+
+
+def get_time_of_day(the_time, buckets=DEFAULT_TIME_BUCKETS):
+    codes, categories = time_buckets(buckets)
+    return categories[codes[the_time]]
+
+
+def time_of_day_column(hours, buckets=DEFAULT_TIME_BUCKETS):
+    codes, categories = time_buckets(buckets)
+    return pd.Categorical.from_codes(codes[hours], categories=categories, ordered=True)
+
+
+def with_time_buckets(df, buckets=DEFAULT_TIME_BUCKETS):
+    # the prepared time_of_day column uses the default buckets
+    if buckets == DEFAULT_TIME_BUCKETS:
+        return df
+    return df.assign(time_of_day=time_of_day_column(df['hour'].values, buckets))
+
+
+def file_hash(file_name, block_size=1 << 20):
+    sha1 = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def cache_file_name(file_name):
+    # columnar sidecar next to the source csv
+    return os.path.splitext(file_name)[0] + '.prepared.feather'
+
+
+def source_fingerprint(file_name):
+    stat = os.stat(file_name)
+    return {'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha1': file_hash(file_name)}
+
+
+def fingerprint_matches(fingerprint, file_name):
+    stat = os.stat(file_name)
+    if fingerprint.get('size') != stat.st_size:
+        return False
+
+    # a matching size and mtime is trusted, otherwise (e.g. the file was copied during
+    # a deploy) the content hash decides
+    return fingerprint.get('mtime_ns') == stat.st_mtime_ns or fingerprint.get('sha1') == file_hash(file_name)
+
+
+def read_cached_frame(file_name, memory_map=False, repair=False):
+    # (prepared frame, validation report) when the sidecar matches the source, else None
+    cache_name = cache_file_name(file_name)
+    if not os.path.exists(cache_name):
+        return None
+
+    try:
+        # only the schema is read here, the columns are loaded once the fingerprint matches
+        with pa.ipc.open_file(cache_name) as reader:
+            metadata = reader.schema.metadata or {}
+        cached = json.loads(metadata.get(CACHE_METADATA_KEY, b'{}'))
+    except (OSError, pa.ArrowInvalid, ValueError) as e:
+        LOG.warning("ignoring unreadable cache %s: %s", cache_name, e)
+        return None
+
+    if (cached.get('version') != CACHE_VERSION or cached.get('repair') != repair
+            or not fingerprint_matches(cached, file_name)):
+        return None
+
+    LOG.info("loading prepared data from cache %s", cache_name)
+    if memory_map:
+        # the columns stay views on the mapped (uncompressed) file: nothing is copied, the pages
+        # are shared with every other process mapping it, and the arrays are read-only
+        return feather.read_table(cache_name, memory_map=True).to_pandas(split_blocks=True), cached['validation']
+    return feather.read_feather(cache_name), cached['validation']
+
+
+def write_cached_frame(df, validation, file_name, repair=False):
+    cache_name = cache_file_name(file_name)
+    fingerprint = {'version': CACHE_VERSION,
+                   'repair': repair,
+                   'validation': validation,
+                   **source_fingerprint(file_name)}
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[CACHE_METADATA_KEY] = json.dumps(fingerprint).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    # write to a temp file first so a concurrent reader never sees a half written cache
+    tmp_name = f"{cache_name}.{os.getpid()}.tmp"
+    try:
+        # uncompressed, so the file can be memory mapped
+        feather.write_feather(table, tmp_name, compression='uncompressed')
+        os.replace(tmp_name, cache_name)
+    except OSError as e:
+        LOG.warning("could not write cache %s: %s", cache_name, e)
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+def state_file_name(file_name):
+    return os.path.splitext(file_name)[0] + '.state.pickle'
+
+
+def read_state(file_name):
+    state_name = state_file_name(file_name)
+    if not os.path.exists(state_name):
+        return None
+
+    try:
+        with open(state_name, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        LOG.warning("ignoring unreadable state %s: %s", state_name, e)
+        return None
+
+    if (not isinstance(state, dict) or state.get('version') != STATE_VERSION
+            or state.get('cache_version') != CACHE_VERSION
+            or not fingerprint_matches(state.get('source', {}), file_name)):
+        return None
+    return state
+
+
+def write_state(state, file_name):
+    state_name = state_file_name(file_name)
+    state = {'version': STATE_VERSION,
+             'cache_version': CACHE_VERSION,
+             'source': source_fingerprint(file_name),
+             **state}
+
+    tmp_name = f"{state_name}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_name, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, state_name)
+    except OSError as e:
+        LOG.warning("could not write state %s: %s", state_name, e)
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+@contextmanager
+def cache_lock(file_name):
+    with open(cache_file_name(file_name) + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def load_source(file_name, chunksize=None, repair=False):
+    df, validation = validate_frame(read_source(file_name, chunksize), repair)
+    if any(n for anomaly, n in validation.items() if anomaly != 'rows'):
+        LOG.warning("anomalies in %s%s: %s", file_name, " (repaired)" if repair else "", validation)
+    return prepare_frame(df), validation
+
+
+def load_shared_frame(file_name, chunksize=None, repair=False):
+    # the first process to take the lock parses the csv and publishes the sidecar, the others
+    # wait for it and all of them then map the same file
+    with cache_lock(file_name):
+        loaded = read_cached_frame(file_name, memory_map=True, repair=repair)
+        if loaded is None:
+            prepared = load_source(file_name, chunksize, repair)
+            write_cached_frame(*prepared, file_name, repair)
+            loaded = read_cached_frame(file_name, memory_map=True, repair=repair)
+            if loaded is None:
+                # the sidecar could not be written, use a private copy
+                loaded = prepared
+    return loaded
+
+
+def categorical_from_keys(keys, make_labels):
+    # factorize integer keys and only build the (few) labels for the unique values
+    codes, uniques = pd.factorize(keys, sort=True)
+    return pd.Categorical.from_codes(codes, categories=make_labels(uniques), ordered=True)
+
+
+def count_columns(df):
+    return [col for col in df.columns if col.endswith('_count')]
+
+
+def aggregate_codes(keys, dims, columns):
+    # The group-by kernel: keys are arrays of small integer codes (one per group field, each
+    # code < its dim) combined into one key, columns are summed per key with np.bincount.
+    # Returns the codes of the groups that occur (in sorted order), their sums and the
+    # position of the first row of each group.
+    flat = np.ravel_multi_index(keys, dims)
+    size = int(np.prod(dims))
+    groups = np.flatnonzero(np.bincount(flat, minlength=size))
+    first = np.full(size, len(flat))
+    np.minimum.at(first, flat, np.arange(len(flat)))
+    # float64 bincount weights are exact for counts, missing counts add nothing
+    sums = [np.rint(np.bincount(flat, weights=np.nan_to_num(column.astype('float64')),
+                                minlength=size)[groups]).astype('int64') for column in columns]
+    return np.unravel_index(groups, dims), sums, first[groups]
+
+
+def aggregate_frame(df, by, sums, firsts=()):
+    # df.groupby(by, observed=True) summing the columns in sums and taking the first row of
+    # the fields in firsts, computed on the category codes the frame was prepared with
+    keys = [df[name].cat.codes.values for name in by]
+    dims = [len(df[name].cat.categories) for name in by]
+    group_codes, totals, first = aggregate_codes(keys, dims, [df[col].values for col in sums])
+
+    data = dict(zip(sums, totals))
+    for name in firsts:
+        data[name] = df[name].values.take(first)
+    index = [pd.CategoricalIndex(pd.Categorical.from_codes(codes, dtype=df[name].dtype), name=name)
+             for name, codes in zip(by, group_codes)]
+    index = pd.MultiIndex.from_arrays(index) if len(index) > 1 else index[0]
+    return pd.DataFrame(data, index=index)
+
+
+def read_only_array(values):
+    if isinstance(values, pd.Categorical):
+        return pd.Categorical.from_codes(read_only_array(values.codes), dtype=values.dtype)
+    values = values.copy()
+    values.flags.writeable = False
+    return values
+
+
+def read_only(result):
+    # memoized results are shared by every caller: they are rebuilt on read-only arrays, so
+    # writing into one raises instead of changing what the next caller gets
+    if isinstance(result, tuple) and hasattr(result, '_fields'):
+        return result._make(read_only(value) for value in result)
+    if isinstance(result, np.ndarray):
+        return read_only_array(result)
+    if not isinstance(result, (pd.Series, pd.DataFrame)):
+        return result
+    if isinstance(result, pd.Series):
+        return pd.Series(read_only_array(result.values), index=result.index, name=result.name, copy=False)
+    columns = {col: read_only_array(result[col].values) for col in result.columns}
+    return pd.DataFrame(columns, index=result.index, copy=False)
+
+
+def result_view(result):
+    # every caller gets its own frame / series on the shared read-only arrays, so adding,
+    # replacing or dropping columns does not reach the memoized result
+    if isinstance(result, tuple) and hasattr(result, '_fields'):
+        return result._make(result_view(value) for value in result)
+    if isinstance(result, (pd.Series, pd.DataFrame)):
+        return result.copy(deep=False)
+    return result
+
+
+def period_bounds(newest):
+    # the last 12 months run from the start of the month 11 months before the newest row up
+    # to the end of the newest hour, the previous 12 months are the same span a year earlier.
+    # Bounds are [start, end) in local time, months start at local midnight.
+    newest = newest.tz_convert(LOCAL_TZ)
+    end = newest + pd.Timedelta(hours=1)
+    start = newest.normalize().replace(day=1) - pd.DateOffset(months=11)
+    year = pd.DateOffset(years=1)
+    return {'previous_year': (start - year, end - year),
+            'last_year': (start, end)}
+
+
+def history_start(newest):
+    # nothing older than this is needed for the periods
+    return period_bounds(newest)['previous_year'][0]
+
+
+def filter_rows(df, start=None):
+    # drop the excluded locations (and everything before start), the raw timestamp strings
+    # are replaced by the parsed timestamps
+    df = df[~df['location_name'].isin(EXCLUDED_LOCATIONS)]
+    # explicit ISO 8601 instead of inferring the format, any offset is converted to UTC
+    timestamps = pd.to_datetime(df['timestamp'], format='ISO8601', utc=True)
+    if start is not None:
+        df, timestamps = df[timestamps >= start], timestamps[timestamps >= start]
+
+    df = df.drop(columns='timestamp')
+    df['timestamp_ts'] = timestamps
+    return df
+
+
+def trim_history(df):
+    if df.empty:
+        return df
+    start = history_start(df['timestamp_ts'].max())
+    return df[df['timestamp_ts'] >= start].reset_index(drop=True)
+
+
+def read_source(file_name, chunksize=None):
+    if chunksize is None:
+        df = pd.read_csv(file_name, usecols=SOURCE_COLUMNS, dtype=SOURCE_DTYPES)
+        return trim_history(filter_rows(df))
+
+    # streaming: the newest timestamp seen so far already tells which rows can never be part
+    # of the periods, so those are dropped per chunk and peak memory is bounded by the chunk
+    # size plus the rows that survive. The rows need not be in time order, the kept chunks
+    # are filtered row by row whenever the start moves.
+    kept, newest, start = [], None, None
+    for chunk in pd.read_csv(file_name, usecols=SOURCE_COLUMNS, dtype=SOURCE_DTYPES, chunksize=chunksize):
+        chunk = filter_rows(chunk, start=start)
+        if chunk.empty:
+            continue
+        newest = max(newest, chunk['timestamp_ts'].max()) if newest is not None else chunk['timestamp_ts'].max()
+        if history_start(newest) != start:
+            start = history_start(newest)
+            kept = [c[c['timestamp_ts'] >= start] for c in kept]
+            kept = [c for c in kept if not c.empty]
+        kept.append(chunk)
+
+    if not kept:
+        # no rows at all: an empty frame with the columns of a read one
+        return filter_rows(pd.read_csv(file_name, usecols=SOURCE_COLUMNS, dtype=SOURCE_DTYPES, nrows=0))
+    return trim_history(pd.concat(kept, ignore_index=True))
+
+
+def validate_rows(rows):
+    # rows: a DataFrame or a list of dicts with (at least) the SOURCE_COLUMNS of the csv
+    df = pd.DataFrame(rows)
+    missing = [col for col in SOURCE_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"rows are missing the columns {missing}")
+
+    return df[SOURCE_COLUMNS].astype(SOURCE_DTYPES)
+
+
+def validate_frame(df, repair=False, existing=None):
+    # Whole-column checks of a filtered frame (location_name, timestamp_ts, counts), returns
+    # the frame and a report {anomaly: number of rows / hours}. With repair, duplicated
+    # (location, hour) rows are dropped (the first one is kept) as are rows with missing or
+    # negative counts; skipped hours can only be reported. Rows of `existing` (e.g. the
+    # newest rows of a DataManager when appending) are taken into account for duplicates
+    # and skipped hours but are neither reported nor repaired.
+    counts = df[count_columns(df)].to_numpy()
+    missing_counts = np.isnan(counts).any(axis=1)
+    negative_counts = (counts < 0).any(axis=1)
+
+    hour = np.timedelta64(1, 'h').astype('m8[ns]').astype('int64')
+    timestamps = df['timestamp_ts'].values.view('int64')
+    off_hour = timestamps % hour != 0
+
+    if existing is None or existing.empty:
+        names = df['location_name']
+        existing_timestamps = timestamps[:0]
+    else:
+        names = pd.concat([existing['location_name'].astype(object), df['location_name'].astype(object)])
+        existing_timestamps = existing['timestamp_ts'].values.view('int64')
+    n_existing = len(existing_timestamps)
+    locations = pd.factorize(names)[0]
+    all_timestamps = np.concatenate([existing_timestamps, timestamps])
+
+    # sort by (location, time), existing rows first for equal keys; consecutive rows of the
+    # same location then show duplicates (step 0) and skipped hours (step > 1h)
+    is_new = np.arange(len(all_timestamps)) >= n_existing
+    order = np.lexsort((is_new, all_timestamps, locations))
+    same_location = locations[order][1:] == locations[order][:-1]
+    step = np.diff(all_timestamps[order])
+    later = order[1:]
+    later_is_new = later >= n_existing
+
+    duplicate = np.zeros(len(df), dtype=bool)
+    duplicate[later[same_location & (step == 0) & later_is_new] - n_existing] = True
+    gaps = same_location & (step > hour) & later_is_new
+    skipped_hours = int(((step[gaps] - 1) // hour).sum())
+
+    report = {'rows': len(df),
+              'duplicate_rows': int(duplicate.sum()),
+              'missing_counts': int(missing_counts.sum()),
+              'negative_counts': int(negative_counts.sum()),
+              'off_hour_rows': int(off_hour.sum()),
+              'skipped_hours': skipped_hours}
+
+    if repair:
+        df = df[~(duplicate | missing_counts | negative_counts)]
+    return df, report
+
+
+def concat_frames(df, new_rows):
+    # concat prepared frames without losing the categoricals: categories only seen in the
+    # new rows are appended, which keeps the ordered categories sorted as long as the new
+    # rows are newer than the existing ones
+    new_rows = new_rows.copy()
+    for col in df.columns:
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        categories = df[col].cat.categories
+        new_categories = new_rows[col].cat.categories
+        extra = new_categories[~new_categories.isin(categories)]
+        if len(extra):
+            df[col] = df[col].cat.add_categories(extra)
+        new_rows[col] = new_rows[col].cat.set_categories(df[col].cat.categories)
+
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+def to_utc(timestamp):
+    # naive timestamps are local time like the calendar fields, an hour repeated at the end of
+    # DST is taken as its first occurrence and one skipped at its start as the next valid time
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tz is None:
+        timestamp = timestamp.tz_localize(LOCAL_TZ, ambiguous=True, nonexistent='shift_forward')
+    return timestamp.tz_convert('UTC')
+
+
+def to_datetime64(timestamp):
+    # naive UTC datetime64 to compare against the values of timestamp_ts
+    return to_utc(timestamp).tz_localize(None).to_datetime64()
+
+
+def rotated_months(first_month):
+    return MONTHS[first_month - 1:] + MONTHS[:first_month - 1]
+
+
+def prepare_frame(df):
+    # the frame is kept sorted by time, periods are then slices of it
+    if not df['timestamp_ts'].is_monotonic_increasing:
+        df = df.sort_values('timestamp_ts', kind='stable', ignore_index=True)
+
+    # prep data - every derived column is computed on whole arrays. Calendar fields are taken
+    # from the Zurich wall clock: one tz conversion, then plain numpy arithmetic. They are
+    # stored with the frame (and its sidecar), so the conversion is done once per source.
+    timestamps = df['timestamp_ts']
+    local = timestamps.dt.tz_convert(LOCAL_TZ).dt.tz_localize(None).values
+    days = local.astype('datetime64[D]')
+    months = local.astype('datetime64[M]').astype('int64')
+    hour = (local - days) // np.timedelta64(1, 'h')
+    month = months % 12 + 1
+    year = months // 12 + 1970
+    # 1970-01-01 was a Thursday
+    weekday = (days.astype('int64') + 3) % 7
+
+    df['location_name'] = df['location_name'].astype('category').cat.remove_unused_categories()
+    df['hour'] = hour.astype('uint8')
+    df['day'] = pd.Categorical.from_codes(weekday, categories=DAYS, ordered=True)
+    # months are ordered from the first month of the periods, so the prepared (and cached) frame
+    # is already in the order DataManager needs
+    first_month = period_bounds(timestamps.iloc[-1])['last_year'][0].month if len(df) else 1
+    df['month'] = pd.Categorical.from_codes((month - first_month) % 12, categories=rotated_months(first_month),
+                                            ordered=True)
+    df['year'] = year.astype('uint16')
+    df['date'] = categorical_from_keys(days, lambda days: pd.DatetimeIndex(days).date)
+    df['month_year'] = categorical_from_keys(year * 12 + month - 1,
+                                             lambda keys: [f"{MONTHS[key % 12]} {key // 12}" for key in keys])
+    df['time_of_day'] = time_of_day_column(hour)
+
+    for col in count_columns(df):
+        df[col] = pd.to_numeric(df[col], downcast='unsigned')
+
+    return df
+
+
+def month_start(timestamp):
+    return timestamp.normalize().replace(day=1)
+
+
+def partition_file_name(root, year, month):
+    return os.path.join(root, f"year={year}", f"month={month:02d}.feather")
+
+
+def write_partitions(df, root):
+    # one feather file per (year, month) of a prepared frame, existing partitions are replaced
+    timestamps = df['timestamp_ts']
+    for (year, month), partition in df.groupby([timestamps.dt.year, timestamps.dt.month]):
+        partition = partition.sort_values('timestamp_ts', kind='stable', ignore_index=True)
+        for col in ['location_name', 'date', 'month_year']:
+            partition[col] = partition[col].cat.remove_unused_categories()
+
+        file_name = partition_file_name(root, year, month)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        tmp_name = f"{file_name}.{os.getpid()}.tmp"
+        feather.write_feather(partition, tmp_name)
+        os.replace(tmp_name, file_name)
+
+
+def partition_source(file_name, root, chunksize=100_000):
+    # stream the csv into year/month partitions, only the month being read is held in
+    # memory. The csv is expected in time order, a month seen again is merged into its file.
+    written = set()
+
+    def flush(df):
+        if df.empty:
+            return
+        keys = set(zip(df['timestamp_ts'].dt.year, df['timestamp_ts'].dt.month))
+        for key in keys & written:
+            df = concat_frames(feather.read_feather(partition_file_name(root, *key)), df)
+        write_partitions(df, root)
+        written.update(keys)
+
+    pending = None
+    for chunk in pd.read_csv(file_name, usecols=SOURCE_COLUMNS, dtype=SOURCE_DTYPES, chunksize=chunksize):
+        chunk = prepare_frame(filter_rows(chunk))
+        if chunk.empty:
+            continue
+        pending = chunk if pending is None else concat_frames(pending, chunk)
+
+        # every month before the newest one read so far is complete
+        complete = pending['timestamp_ts'] < month_start(pending['timestamp_ts'].max())
+        flush(pending[complete])
+        pending = pending[~complete].reset_index(drop=True)
+
+    if pending is not None:
+        flush(pending)
+
+
+class DatasetRegistry():
+    # One DataReloader per dataset id, opened when the dataset is first asked for. At most
+    # max_open of them are kept, the least recently used one is stopped and dropped first
+    # (requests still holding one of its snapshots keep working with it).
+
+    def __init__(self, datasets=None, max_open=4, **reloader_args):
+        self.datasets = DATASETS if datasets is None else datasets
+        self.max_open = max_open
+        self.reloader_args = reloader_args
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        # one lock per dataset id, held while that dataset loads, so only requests for it wait
+        self._loading = {}
+
+    def get(self, dataset_id):
+        if dataset_id not in self.datasets:
+            raise KeyError(f"unknown dataset {dataset_id!r}")
+
+        with self._lock:
+            reloader = self._open.get(dataset_id)
+            if reloader is not None:
+                self._open.move_to_end(dataset_id)
+                return reloader
+            loading = self._loading.setdefault(dataset_id, threading.Lock())
+
+        with loading:
+            with self._lock:
+                # loaded by another request while this one waited
+                reloader = self._open.get(dataset_id)
+                if reloader is not None:
+                    self._open.move_to_end(dataset_id)
+                    return reloader
+
+            # the data (and layout) are built without holding the registry lock
+            reloader = DataReloader(self.datasets[dataset_id], **self.reloader_args)
+            reloader.start()
+            with self._lock:
+                self._open[dataset_id] = reloader
+                evicted = [self._open.popitem(last=False) for _ in range(len(self._open) - self.max_open)]
+
+        for evicted_id, evicted_reloader in evicted:
+            evicted_reloader.stop()
+            LOG.info("closed dataset %s", evicted_id)
+        return reloader
+
+    def current(self, dataset_id):
+        return self.get(dataset_id).current()
+
+    def stop(self):
+        with self._lock:
+            reloaders = list(self._open.values())
+            self._open.clear()
+        for reloader in reloaders:
+            reloader.stop()
+
+
+class PartitionedStore():
+    # Prepared data stored as <root>/year=YYYY/month=MM.feather. Partitions are read when a
+    # time range touches them, and at most max_resident of them are kept in memory (least
+    # recently used ones are dropped first).
+
+    def __init__(self, root, max_resident=24):
+        self.root = root
+        self.max_resident = max_resident
+        self._resident = OrderedDict()
+        self.partitions = self._scan()
+
+    def _scan(self):
+        partitions = []
+        for year_dir in os.listdir(self.root):
+            year = re.fullmatch(r'year=(\d{4})', year_dir)
+            if not year:
+                continue
+            for month_file in os.listdir(os.path.join(self.root, year_dir)):
+                month = re.fullmatch(r'month=(\d{2})\.feather', month_file)
+                if month:
+                    partitions.append((int(year.group(1)), int(month.group(1))))
+        return sorted(partitions)
+
+    def _load(self, key, keep=True):
+        if key in self._resident:
+            self._resident.move_to_end(key)
+            return self._resident[key]
+
+        df = feather.read_feather(partition_file_name(self.root, *key))
+        if not keep:
+            return df
+
+        self._resident[key] = df
+        while len(self._resident) > self.max_resident:
+            self._resident.popitem(last=False)
+        return df
+
+    def newest(self):
+        return self._load(self.partitions[-1])['timestamp_ts'].iloc[-1]
+
+    def load(self, start, end, keep=True):
+        # the rows with start <= timestamp_ts < end, keep=False reads the partitions without
+        # making them resident
+        start, end = to_utc(start), to_utc(end)
+        first = (start.year, start.month)
+        keys = [key for key in self.partitions if first <= key <= (end.year, end.month)]
+
+        df = None
+        for key in keys:
+            partition = self._load(key, keep)
+            df = partition.copy() if df is None else concat_frames(df, partition)
+
+        if df is None:
+            return None
+        timestamps = df['timestamp_ts']
+        return df[(timestamps >= start) & (timestamps < end)].reset_index(drop=True)
+
+
+class LocationRegistry():
+    # The locations (sections) of a frame: names are the locations with rows, in category
+    # order, and code() their category code (the location index of the cube).
+
+    def __init__(self, df):
+        locations = df['location_name'].cat
+        self.categories = locations.categories
+        sizes = np.bincount(locations.codes.values, minlength=len(self.categories))
+        self.names = [name for name, size in zip(self.categories, sizes) if size]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def code(self, name):
+        # raises a KeyError for an unknown location
+        return self.categories.get_loc(name)
+
+
+def wall_clock_hours(utc_hours):
+    # local wall clock hours since 1970 of UTC hours since 1970
+    utc = pd.DatetimeIndex(np.asarray(utc_hours, dtype='int64').astype('datetime64[h]').astype('datetime64[s]'),
+                           tz='UTC')
+    return utc.tz_convert(LOCAL_TZ).tz_localize(None).values.astype('datetime64[h]').astype('int64')
+
+
+class RollupCube():
+    # The counts of a prepared frame summed per location and UTC hour as dense arrays:
+    # counts[column, location, hour] and rows[location, hour], the number of rows in each
+    # cell. Position h of the hour axis is UTC hour origin + h (hours since 1970), so the two
+    # hours of the autumn DST change are separate cells. wall_clock[h] is its local wall clock
+    # hour, the calendar fields of a cell are derived from it. Queries reduce the cells of a
+    # period with integer group keys instead of grouping the rows.
+    # prefix[column, location, h] is the sum of the cells before hour h, so the total of any
+    # hour range is the difference of two lookups.
 
-def get_time_of_day(the_time):
-    if the_time < 6:
-        return 'Night'
-    elif the_time < 12: 
-        return 'Morning'
-    elif the_time < 18:
-        return 'Afternoon'
-    elif the_time < 24:
-        return 'Evening'    
+    def __init__(self, df):
+        self.columns = count_columns(df)
+        self.origin = int(self.cells(df, 0)[1].min())
+        self.wall_clock = np.zeros(0, dtype='int64')
+        self.first_day = np.datetime64(int(wall_clock_hours([self.origin])[0]) // 24, 'D')
+        self.counts = np.zeros((len(self.columns), 0, 0), dtype='int64')
+        self.rows = np.zeros((0, 0), dtype='int32')
+        self.prefix = np.zeros((len(self.columns), 0, 1), dtype='int64')
+        self.add(df)
+
+    def _resize(self, origin, n_locations, n_hours):
+        # the cells move along when the axis starts earlier (rows older than the origin), only
+        # the wall clock hours of the new positions are converted
+        shift = self.origin - origin
+        old_locations, old_hours = self.rows.shape
+        counts = np.zeros((len(self.columns), n_locations, n_hours), dtype='int64')
+        rows = np.zeros((n_locations, n_hours), dtype='int32')
+        counts[:, :old_locations, shift:shift + old_hours] = self.counts
+        rows[:old_locations, shift:shift + old_hours] = self.rows
+        self.wall_clock = np.concatenate([wall_clock_hours(origin + np.arange(shift)), self.wall_clock,
+                                          wall_clock_hours(origin + np.arange(shift + old_hours, n_hours))])
+        self.origin, self.counts, self.rows = origin, counts, rows
+        self.first_day = np.datetime64(int(self.wall_clock[0]) // 24, 'D')
+        self.prefix = np.zeros((len(self.columns), n_locations, n_hours + 1), dtype='int64')
+
+    def add(self, df):
+        # rows of the frame (same location categories, e.g. appended rows) are added to the cells
+        if df.empty:
+            return
+
+        locations, hours = self.cells(df, 0)
+        origin = min(self.origin, int(hours.min()))
+        shift = self.origin - origin
+        hours -= origin
+
+        shape = (max(self.rows.shape[0], len(df['location_name'].cat.categories)),
+                 max(int(hours.max()) + 1, shift + self.rows.shape[1]))
+        # the prefix sums are recomputed from the first changed hour on
+        changed = int(hours.min())
+        if origin != self.origin or shape != self.rows.shape:
+            self._resize(origin, *shape)
+            changed = 0
+
+        cells = locations * shape[1] + hours
+        size = shape[0] * shape[1]
+        self.rows += np.bincount(cells, minlength=size).reshape(shape).astype('int32')
+        for i, column in enumerate(self.columns):
+            # missing counts add nothing, as in a groupby sum
+            values = np.nan_to_num(df[column].values.astype('float64'))
+            sums = np.bincount(cells, weights=values, minlength=size)
+            self.counts[i] += np.rint(sums).astype('int64').reshape(shape)
+
+        self.prefix[..., changed + 1:] = (self.prefix[..., changed, None]
+                                          + np.cumsum(self.counts[..., changed:], axis=-1))
+
+    def cells(self, df, origin=None):
+        # location code and hour axis position of each row (UTC hours since 1970 for origin 0)
+        origin = self.origin if origin is None else origin
+        hours = df['timestamp_ts'].values.astype('datetime64[h]').astype('int64') - origin
+        return df['location_name'].cat.codes.values.astype('int64'), hours
+
+    def hour_index(self, timestamp, end=False, clip=True):
+        # position on the hour axis, clipped to the axis. A start is the hour it falls in, an
+        # end is exclusive: the hour it falls in is only included when it starts before it.
+        hour = to_utc(timestamp).value / 3600e9
+        hour = (int(np.ceil(hour)) if end else int(np.floor(hour))) - self.origin
+        return min(max(hour, 0), self.rows.shape[1]) if clip else hour
+
+    def hour_range(self, start, end):
+        lo = self.hour_index(start)
+        return lo, max(self.hour_index(end, end=True), lo)
+
+    def local_hours(self, hours):
+        # local wall clock hours since 1970 of hour axis positions, also outside of the axis
+        hours = np.asarray(hours, dtype='int64')
+        if hours.size and (hours.min() < 0 or hours.max() >= len(self.wall_clock)):
+            return wall_clock_hours(self.origin + hours)
+        return self.wall_clock[hours]
+
+    def local_starts(self, lo, hi, freq):
+        # hour axis positions in [lo, hi) at which a local day ('D'), month ('M') or week ('W',
+        # every 7th day from the day of lo) starts
+        hours = np.arange(lo, hi)
+        local = self.local_hours(hours)
+        days = local // 24
+        starts = local % 24 == 0
+        if freq == 'M':
+            months = days.astype('datetime64[D]').astype('datetime64[M]')
+            starts &= months.astype('datetime64[D]').astype('int64') == days
+        elif freq == 'W':
+            starts &= (days - days[:1]) % 7 == 0
+        elif freq != 'D':
+            raise ValueError(f"freq must be 'D', 'W' or 'M', not {freq!r}")
+        return hours[starts]
+
+    def hour_of_week(self, hours):
+        # local slot 0..167 of hour axis positions, Monday 00:00 is slot 0
+        local = self.local_hours(hours)
+        return (local // 24 + 3) % 7 * 24 + local % 24
+
+    def totals(self, column, boundaries, location=None):
+        # the sums between consecutive hour boundaries, two prefix lookups each. location is
+        # a location code, None sums over all locations.
+        prefix = self.prefix[self.columns.index(column)]
+        prefix = prefix[:, boundaries].sum(axis=0) if location is None else prefix[location, boundaries]
+        return np.diff(prefix)
+
+    def cell_keys(self, start, end, first_month, buckets=DEFAULT_TIME_BUCKETS, location=None):
+        # the cells of [start, end) that have rows: location codes, hour axis positions, months
+        # since 1970 and the integer key of every field (months counted from first_month).
+        # A location code restricts them to that location's slice of the cube.
+        time_of_day, _ = time_buckets(buckets)
+        lo, hi = self.hour_range(start, end)
+        locations = slice(None) if location is None else slice(location, location + 1)
+        hour, location = np.nonzero(self.rows[locations, lo:hi].T)
+        hour += lo
+        location += locations.start or 0
+
+        local = self.local_hours(hour)
+        day = local // 24
+        month_years = day.astype('datetime64[D]').astype('datetime64[M]').astype('int64')
+        keys = {'location_name': location,
+                'time_of_day': time_of_day[local % 24],
+                'hour': local % 24,
+                'day': (day + 3) % 7,
+                'date': day - self.first_day.astype('int64'),
+                'month': (month_years - first_month) % 12,
+                'month_year': month_years - month_years.min(initial=0)}
+        return location, hour, month_years, keys
+
+    def reduce(self, start, end, by, sums, firsts, dtypes, buckets=DEFAULT_TIME_BUCKETS, location=None):
+        # the cells of [start, end) summed per group of the fields in by, firsts are fields
+        # taken from the first cell of each group. dtypes are the frame's dtypes, the result
+        # has the index and columns of the frame based query (with the time of day buckets).
+        # A location code restricts the cells to that location's slice of the cube.
+        dtypes = dict(dtypes, time_of_day=pd.CategoricalDtype(time_buckets(buckets)[1], ordered=True))
+        first_month = MONTHS.index(dtypes['month'].categories[0])
+        location, hour, month_years, keys = self.cell_keys(start, end, first_month, buckets, location)
+
+        group_keys = [keys[name] for name in by]
+        dims = [int(key.max(initial=0)) + 1 for key in group_keys]
+        cells = [self.counts[self.columns.index(column), location, hour] for column in sums]
+        group_codes, totals, first = aggregate_codes(group_keys, dims, cells)
+
+        data = dict(zip(sums, totals))
+        for name in firsts:
+            data[name] = self._labels(name, keys[name][first], month_years[first], dtypes)
+        index = [pd.CategoricalIndex(self._labels(name, codes, month_years[first], dtypes), name=name)
+                 for name, codes in zip(by, group_codes)]
+        index = pd.MultiIndex.from_arrays(index) if len(index) > 1 else index[0]
+        return pd.DataFrame(data, index=index)
+
+    def _labels(self, name, keys, month_years, dtypes):
+        # dates are days since the first (local) day, month_years (of the same groups) months since
+        # 1970, keys of the other fields are the codes of the frame's categories
+        if name == 'date':
+            days = self.first_day + keys
+            return pd.Categorical(pd.DatetimeIndex(days).date, dtype=dtypes[name])
+        if name == 'month_year':
+            labels = [f"{MONTHS[key % 12]} {key // 12 + 1970}" for key in month_years]
+            return pd.Categorical(labels, dtype=dtypes[name])
+        return pd.Categorical.from_codes(keys, dtype=dtypes[name])
+
+
+class SeasonalBaseline():
+    # Robust profile of values per slot (e.g. location x hour of week): the values of each
+    # slot are kept sorted in one array (slot by slot), so medians and quartiles are lookups.
+    # New values are merged in with one pass over the array per batch. Scores are robust z-scores,
+    # (value - median) / spread with spread = IQR / 1.349 (the standard deviation for normally
+    # distributed values), at least MIN_SPREAD so empty night hours do not divide by zero.
+
+    MIN_SPREAD = 1.0
+
+    def __init__(self, slots, values, n_slots):
+        order = np.lexsort((values, slots))
+        self.values = np.asarray(values, dtype='float64')[order]
+        self.offsets = np.zeros(n_slots + 1, dtype='int64')
+        np.cumsum(np.bincount(slots, minlength=n_slots), out=self.offsets[1:])
+        self.median = np.full(n_slots, np.nan)
+        self.spread = np.full(n_slots, np.nan)
+        self._update(np.arange(n_slots))
+
+    def _quantile(self, slots, q):
+        # linear interpolation between the sorted values of each slot, NaN for empty slots
+        lo = self.offsets[slots]
+        last = np.maximum(self.offsets[slots + 1] - lo - 1, 0)
+        position = q * last
+        below = np.floor(position).astype('int64')
+        above = np.minimum(below + 1, last)
+        empty = self.offsets[slots + 1] == lo
+        values = np.append(self.values, np.nan)
+        below_value = values[np.where(empty, len(self.values), lo + below)]
+        above_value = values[np.where(empty, len(self.values), lo + above)]
+        return below_value + (above_value - below_value) * (position - below)
+
+    def _update(self, slots):
+        self.median[slots] = self._quantile(slots, 0.5)
+        iqr = self._quantile(slots, 0.75) - self._quantile(slots, 0.25)
+        self.spread[slots] = np.maximum(iqr / 1.349, self.MIN_SPREAD)
+
+    def add(self, slots, values):
+        # new values (e.g. of appended hours): their positions in the sorted slots are binary
+        # searches, then all of them go in with one np.insert, i.e. one copy of the array per
+        # batch rather than per value. Only the profile of those slots is recomputed.
+        slots = np.asarray(slots, dtype='int64')
+        values = np.asarray(values, dtype='float64')
+        # sorted by slot and value, so values with the same position keep their order
+        order = np.lexsort((values, slots))
+        slots, values = slots[order], values[order]
+        positions = self.offsets[slots] + np.array(
+            [np.searchsorted(self.values[self.offsets[slot]:self.offsets[slot + 1]], value)
+             for slot, value in zip(slots, values)], dtype='int64')
+        self.values = np.insert(self.values, positions, values)
+        self.offsets[1:] += np.cumsum(np.bincount(slots, minlength=len(self.offsets) - 1))
+        self._update(np.unique(slots))
+
+    def score(self, slots, values):
+        return (values - self.median[slots]) / self.spread[slots]
+
+    def quantile(self, q):
+        # the q quantile of every slot
+        return self._quantile(np.arange(len(self.median)), q)
+
+
+# day_densities() result: kernel densities of the daily totals of each weekday on one grid
+# of counts, density[day, point] (NaN outside of the day's span), quantiles[day] (25%, median,
+# 75%) and the number of days of each weekday
+DayDensities = namedtuple('DayDensities', ['grid', 'density', 'quantiles', 'days'])
+
+
+def kernel_densities(groups, values, n_groups, points=100):
+    # gaussian kernel density of the values of each group on a common grid of points.
+    # Bandwidths follow Silverman's rule like plotly's violins, a group's curve spans its
+    # values +- 2 bandwidths. Returns grid, density[group, point], quartiles[group], counts.
+    values = np.asarray(values, dtype='float64')
+    profile = SeasonalBaseline(groups, values, n_groups)
+    n = np.bincount(groups, minlength=n_groups)
+    mean = np.bincount(groups, weights=values, minlength=n_groups) / np.maximum(n, 1)
+    std = np.sqrt(np.bincount(groups, weights=(values - mean[groups]) ** 2, minlength=n_groups)
+                  / np.maximum(n - 1, 1))
+    # spread is IQR / 1.349, at least MIN_SPREAD so a constant group still has a curve
+    bandwidth = 1.059 * np.maximum(np.minimum(std, profile.spread), profile.MIN_SPREAD) * np.maximum(n, 1) ** -0.2
+    lo = profile.quantile(0) - 2 * bandwidth
+    hi = profile.quantile(1) + 2 * bandwidth
+
+    grid = np.linspace(lo[n > 0].min(), hi[n > 0].max(), points) if n.any() else np.zeros(points)
+    kernel = np.exp(-0.5 * ((grid - values[:, None]) / bandwidth[groups, None]) ** 2)
+    kernel /= bandwidth[groups, None] * np.sqrt(2 * np.pi)
+    density = np.zeros((n_groups, points))
+    np.add.at(density, groups, kernel)
+    density /= np.maximum(n, 1)[:, None]
+    density[(grid < lo[:, None]) | (grid > hi[:, None]) | (n == 0)[:, None]] = np.nan
+
+    quartiles = np.stack([profile.quantile(q) for q in (0.25, 0.5, 0.75)], axis=1)
+    return grid, density, quartiles, n
+
+
+# compare_periods() result: totals[period, bucket] for the buckets (calendar months, or weeks
+# since the start of each period) named in labels, deltas and changes (in %) between
+# consecutive periods. Buckets outside of a period or of the loaded data are NaN.
+PeriodComparison = namedtuple('PeriodComparison', ['periods', 'labels', 'totals', 'deltas', 'changes'])
+
+
+# summary() result: the headline facts of a period. location_totals per location (busiest
+# first), ratio of the busiest to the second busiest location, total of the period before and
+# change (in %), busiest weekday and time of day, the share of months in which that time of
+# day was the busiest.
+Summary = namedtuple('Summary', ['total', 'location_totals', 'ratio', 'previous_total', 'change',
+                                 'busiest_day', 'busiest_time_of_day', 'time_of_day_share'])
+
+
+def connector_arrays(comparison):
+    # x (totals) and y (labels) of one line per bucket through all periods, separated by None
+    # as plotly draws them as a single trace, each built in one allocation
+    n_periods, n_buckets = comparison.totals.shape
+    x = np.full((n_buckets, n_periods + 1), None, dtype=object)
+    x[:, :n_periods] = comparison.totals.T
+    y = np.full((n_buckets, n_periods + 1), None, dtype=object)
+    y[:, :n_periods] = np.asarray(comparison.labels, dtype=object)[:, None]
+    return x.ravel(), y.ravel()
+
+
+# hierarchy() result: one entry per node of every level (outermost first) as plotly's
+# sunburst / treemap arrays. ids are the labels of the path joined by "/", the parent of the
+# outermost nodes is "".
+Hierarchy = namedtuple('Hierarchy', ['ids', 'labels', 'parents', 'values'])
+
+
+def hierarchy_arrays(keys, dims, labels, values):
+    # keys are the integer codes of each level (outermost first) with dims distinct codes and
+    # the labels of the codes. The values are summed once per leaf, every outer level sums
+    # the (few) leaves: its codes are the leaf codes divided by the sizes of the inner levels.
+    leaves, inverse = np.unique(np.ravel_multi_index(keys, dims), return_inverse=True)
+    totals = np.bincount(inverse, weights=values, minlength=len(leaves))
+
+    ids, names, parents, sums = [], [], [], []
+    outer_groups = outer_ids = None
+    for level, size in enumerate(dims):
+        groups, inverse = np.unique(leaves // int(np.prod(dims[level + 1:], dtype='int64')),
+                                    return_inverse=True)
+        level_names = np.asarray(labels[level], dtype=object)[groups % size]
+        if outer_groups is None:
+            level_parents = np.full(len(groups), '', dtype=object)
+            level_ids = level_names
+        else:
+            level_parents = outer_ids[np.searchsorted(outer_groups, groups // size)]
+            level_ids = level_parents + '/' + level_names
+        ids.append(level_ids)
+        names.append(level_names)
+        parents.append(level_parents)
+        sums.append(np.bincount(inverse, weights=totals, minlength=len(groups)))
+        outer_groups, outer_ids = groups, level_ids
+
+    return (np.concatenate(ids), np.concatenate(names), np.concatenate(parents),
+            np.rint(np.concatenate(sums)).astype('int64'))
+
+
+def rolling_stats(values, window):
+    # mean and standard deviation of the window centered on each value, leaving the value
+    # itself out (the window is cut at both ends, NaNs are skipped), from cumulative sums in
+    # linear time
+    values = np.asarray(values, dtype='float64')
+    known = np.isfinite(values)
+    filled = np.where(known, values, 0.0)
+    positions = np.arange(len(values))
+    lo = np.maximum(positions - window // 2, 0)
+    hi = np.minimum(positions + window // 2 + 1, len(values))
+
+    def window_sum(x):
+        sums = np.concatenate([[0.0], np.cumsum(x)])
+        return sums[hi] - sums[lo] - x
+
+    n = window_sum(known.astype('float64'))
+    mean = np.divide(window_sum(filled), n, out=np.full(len(values), np.nan), where=n > 0)
+    mean_square = np.divide(window_sum(filled ** 2), n, out=np.full(len(values), np.nan), where=n > 0)
+    return mean, np.sqrt(np.maximum(mean_square - mean ** 2, 0))
+
+
+def detect_peaks(values, window=9, threshold=3.0, min_lift=0.1, cycle=7):
+    # positions of values (one per day, NaN for missing days) far above the same weekday of
+    # the surrounding weeks: more than threshold standard deviations and min_lift above the
+    # mean of the window weeks around them. Of each run of consecutive such days only the
+    # highest is a peak.
+    values = np.asarray(values, dtype='float64')
+    mean = np.full(len(values), np.nan)
+    std = np.full(len(values), np.nan)
+    for weekday in range(cycle):
+        mean[weekday::cycle], std[weekday::cycle] = rolling_stats(values[weekday::cycle], window)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = (values - mean) / std
+        flagged = np.flatnonzero((score > threshold) & (values > mean * (1 + min_lift)))
+    if not len(flagged):
+        return flagged, score[flagged]
+
+    run_starts = np.flatnonzero(np.diff(flagged, prepend=-2) > 1)
+    run_ids = np.repeat(np.arange(len(run_starts)), np.diff(np.append(run_starts, len(flagged))))
+    # the highest value of a run: sort by (run, value) and take the last of each run
+    order = np.lexsort((values[flagged], run_ids))
+    run_ends = np.append(run_starts[1:], len(flagged)) - 1
+    peaks = flagged[order[run_ends]]
+    return peaks, score[peaks]
+
+
+def read_event_calendar(file_name=EVENTS_FILE_NAME):
+    # known events as start, end (inclusive dates) and name, sorted by start. None without a
+    # calendar file.
+    if file_name is None or not os.path.exists(file_name):
+        return None
+    calendar = pd.read_csv(file_name, parse_dates=['start', 'end'], comment='#')
+    return calendar.sort_values('start', ignore_index=True)
+
+
+def name_events(dates, calendar):
+    # the name of the calendar event each date falls into, None for dates outside of all of
+    # them (binary search over the sorted starts)
+    names = np.full(len(dates), None, dtype=object)
+    if calendar is None or calendar.empty:
+        return names
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    starts = calendar['start'].values.astype('datetime64[D]')
+    candidate = np.searchsorted(starts, dates, side='right') - 1
+    inside = (candidate >= 0) & (dates <= calendar['end'].values.astype('datetime64[D]')[np.maximum(candidate, 0)])
+    names[inside] = calendar['name'].values[candidate[inside]]
+    return names
 
 
 class DataManager():
     
-    def __init__(self, file_name='data/hystreet_fussgaengerfrequenzen_seit2021.csv'):
-
-        df = pd.read_csv(file_name)
-        
-        # prep data   
-        df['timestamp_ts']=pd.to_datetime(df['timestamp'])
-        df['hour'] = df['timestamp_ts'].dt.hour
-        df['day'] = df['timestamp_ts'].dt.day_name()
-        df['month'] = df['timestamp_ts'].dt.month_name()
-        df['year'] = df['timestamp_ts'].dt.year
-        df['date'] = df['timestamp_ts'].dt.date
-        df['month_year'] = df['month'] +" "+df['timestamp_ts'].dt.strftime('%Y')
-        df['time_of_day'] = df['hour'].apply(get_time_of_day)  
-        df['month'] = pd.Categorical(df['month'],
-                                       categories=[ 'October', 'November', 'December','January','February','March','April','May','June', 'July','August', 'September'],
-                                       ordered=True)
-
-        Oct1_2021 = pd.Timestamp("2021-10-01", tz="UTC")
-        Oct1_2022 = pd.Timestamp("2022-10-01", tz="UTC")
-        Oct1_2023 = pd.Timestamp("2023-10-01", tz="UTC")
-  
-        #remove nord data - Nord data is incomplete.
-        df = df[df['location_name'] != 'Bahnhofstrasse (Nord)']
-  
-    
-        self.DF_PREVIOUS_YEAR = df[(df['timestamp_ts'] > Oct1_2021) & (df['timestamp_ts'] < Oct1_2022 ) ].copy()
-        self.DF_LAST_YEAR = df[(df['timestamp_ts'] > Oct1_2022) & (df['timestamp_ts'] < Oct1_2023)].copy()
-        
-    def location_date_time_last_year(self):
-        df_by_date = self.DF_LAST_YEAR.groupby(["month",'time_of_day', 'location_name']).agg(
-                {"pedestrians_count": "sum", "adult_pedestrians_count":'sum', 'child_pedestrians_count':'sum' ,"month_year":'first' })
-        return df_by_date
-        
+    def __init__(self, file_name=DEFAULT_FILE_NAME, use_cache=True, chunksize=None, store=None, shared=False,
+                 repair=False):
+
+        # with a PartitionedStore only the partitions of the periods are read, older ones are
+        # read when a window reaches back to them
+        self.store = store
+        if store is not None:
+            newest = store.newest()
+            # the periods are held by the DataManager itself, not as resident partitions
+            df = store.load(history_start(newest), newest + pd.Timedelta(hours=1), keep=False)
+            validation = None
+        elif shared:
+            # for several worker processes: one of them publishes the prepared frame, all of them
+            # use it as read-only memory mapped columns
+            df, validation = load_shared_frame(file_name, chunksize, repair)
+        else:
+            loaded = read_cached_frame(file_name, repair=repair) if use_cache else None
+            if loaded is None:
+                loaded = load_source(file_name, chunksize, repair)
+                if use_cache:
+                    write_cached_frame(*loaded, file_name, repair)
+            df, validation = loaded
+
+        # anomalies found in the source / in the last appended rows by validate_frame()
+        # (None for a PartitionedStore)
+        self.validation = validation
+        self.append_validation = None
+        self.repair = repair
+
+        # one frame sorted by timestamp_ts, periods and windows are slices of it
+        self.df = df
+        self.periods = {}
+        self.file_name = file_name if store is None else None
+
+        # hourly counts per location, built from the frame by _update_periods(), and the
+        # location x hour of week baselines of its count columns, built on first use
+        self.cube = None
+        self._baselines = {}
+        # the locations of the frame, see LocationRegistry
+        self._locations = None
+
+        # memoized query results, (query, arguments, data version) -> read-only result. The
+        # data version changes whenever the data does, results of older versions are dropped.
+        self.data_version = 0
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+        # append() changes the frame, the cube and the baselines in place: it holds this lock
+        # for the whole update and every query holds it while it reads them, so no query (and
+        # no memoized result) sees a half appended state
+        self._data_lock = threading.RLock()
+        self._appended = False
+        self._update_periods()
+
+        # warm start: the computed state of an earlier run on the same source is restored,
+        # otherwise it is computed now and saved for the next start
+        if use_cache and self.file_name is not None and not self.restore_state():
+            self.warm_up()
+            self.save_state()
+
+    def warm_up(self):
+        for method, period in WARM_QUERIES:
+            self._aggregate(method, period)
+        self.summary()
+
+    def save_state(self):
+        # the state has to match the source file, rows added with append() are not in it
+        if self.file_name is None or self._appended:
+            LOG.info("not saving the state, it does not match a source file")
+            return False
+
+        with self._memo_lock:
+            memo = dict(self._memo)
+        write_state({'periods': self.periods, 'repair': self.repair, 'memo': memo},
+                    self.file_name)
+        return True
+
+    def restore_state(self):
+        state = read_state(self.file_name)
+        if state is None or state['periods'] != self.periods or state.get('repair') != self.repair:
+            return False
+
+        LOG.info("restored computed state for %s", self.file_name)
+        # the restored results are valid for the data as loaded now
+        self._memo = OrderedDict(((name, args, self.data_version), read_only(result))
+                                 for (name, args, _), result in state['memo'].items())
+        return True
+
+    @property
+    def newest(self):
+        return self.df['timestamp_ts'].iloc[-1]
+
+    def window(self, start, end):
+        # rows with start <= timestamp_ts < end: two binary searches and a positional slice,
+        # which is a view on the frame rather than a copy
+        with self._data_lock:
+            return self._window(start, end)
+
+    def _window(self, start, end):
+        first = self.df['timestamp_ts'].iloc[0]
+        if self.store is not None and to_utc(start) < first:
+            return self._window_from_store(start, end, first)
+
+        timestamps = self.df['timestamp_ts'].values
+        lo = timestamps.searchsorted(to_datetime64(start), side='left')
+        hi = timestamps.searchsorted(to_datetime64(end), side='left')
+        return self.df.iloc[lo:hi]
+
+    def _window_from_store(self, start, end, first):
+        # older rows come from the partitions, as a new frame rather than a view
+        df = self.store.load(start, min(to_utc(end), first))
+        if df is None:
+            return self.window(first, end)
+
+        df = concat_frames(df, self.window(first, end))
+        df['month'] = df['month'].cat.reorder_categories(self.df['month'].cat.categories)
+        return df
+
+    @property
+    def locations(self):
+        # built from the frame on first use after the data changed
+        locations = self._locations
+        if locations is None:
+            locations = self._locations = LocationRegistry(self.df)
+        return locations
+
+    def period(self, name):
+        return self.window(*self.periods[name])
+
+    @property
+    def DF_PREVIOUS_YEAR(self):
+        return self.period('previous_year')
+
+    @property
+    def DF_LAST_YEAR(self):
+        return self.period('last_year')
+
+    def _update_periods(self):
+        periods = period_bounds(self.newest)
+        starts_moved = any(periods[name][0] != self.periods.get(name, (None, None))[0] for name in periods)
+
+        if starts_moved:
+            # a new month started: drop the history no period needs anymore, let the months
+            # start with the first month of the periods and recompute the aggregates on demand
+            start = periods['previous_year'][0]
+            if self.df['timestamp_ts'].iloc[0] < start:
+                self.df = self.window(start, periods['last_year'][1]).reset_index(drop=True)
+
+            months = rotated_months(periods['last_year'][0].month)
+            if list(self.df['month'].cat.categories) != months:
+                self.df['month'] = self.df['month'].cat.reorder_categories(months)
+            self.cube = RollupCube(self.df)
+            self._baselines = {}
+            self._data_changed()
+
+        self.periods = periods
+        return starts_moved
+
+    def _data_changed(self):
+        with self._memo_lock:
+            self.data_version += 1
+            self._memo.clear()
+        self._locations = None
+
+    def _memoized(self, compute, *args):
+        # compute(*args) once per data version, later calls with the same arguments share the
+        # (read-only) arrays of the result, see result_view()
+        key = (compute.__name__, args, self.data_version)
+        with self._memo_lock:
+            result = self._memo.get(key)
+            if result is not None:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return result_view(result)
+            self.memo_misses += 1
+
+        with self._data_lock:
+            result = read_only(compute(*args))
+        with self._memo_lock:
+            self._memo[key] = result
+            while len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return result_view(result)
+
+    def memo_info(self):
+        return {'hits': self.memo_hits, 'misses': self.memo_misses, 'size': len(self._memo),
+                'max_size': MEMO_SIZE, 'data_version': self.data_version}
+
+    def _aggregate(self, method, period, buckets=DEFAULT_TIME_BUCKETS, location=None):
+        # one memoized result per time of day bucket configuration (and location), so switching
+        # between them only reduces the cube once for each
+        return self._memoized(self._reduce, method, period, buckets, location)
+
+    def _reduce(self, method, period, buckets, location):
+        # reduced from the rollup cube, the frame based method gives the same result
+        by, sums, firsts = ROLLUPS[method]
+        return self.cube.reduce(*self.periods[period], by, sums, firsts, self.df.dtypes, buckets,
+                                self._location_code(location))
+
+    def append(self, rows):
+        # derive columns for the new rows only and add them to the rollup cube, queries of other
+        # threads wait until the update is complete
+        with self._data_lock:
+            return self._append(rows)
+
+    def _append(self, rows):
+        new_rows = filter_rows(validate_rows(rows))
+        if not new_rows.empty:
+            # validated against the existing rows from the last day (or from the oldest new row),
+            # enough to find hours that are repeated or skipped between the two
+            start = min(new_rows['timestamp_ts'].min(), self.newest - pd.Timedelta(days=1))
+            existing = self.window(start, self.newest + pd.Timedelta(hours=1))
+            new_rows, self.append_validation = validate_frame(new_rows, self.repair, existing)
+        new_rows = prepare_frame(new_rows)
+        appended = len(new_rows)
+        if not appended:
+            return 0
+
+        self._appended = True
+        in_order = new_rows['timestamp_ts'].iloc[0] >= self.newest
+        old_length = len(self.df)
+
+        self.df = concat_frames(self.df, new_rows)
+        # the new rows as part of the frame (i.e. with the frame's categories) go into the cube,
+        # the queries are computed from it again on demand
+        self.cube.add(self.df.iloc[old_length:])
+        self._update_baselines(self.df.iloc[old_length:])
+        if not in_order:
+            self.df = self.df.sort_values('timestamp_ts', kind='stable', ignore_index=True)
+        self._update_periods()
+        self._data_changed()
+
+        return appended
+
+    def location_date_time(self, df, buckets=DEFAULT_TIME_BUCKETS):
+        return aggregate_frame(with_time_buckets(df, buckets), *ROLLUPS['location_date_time'])
+
+    def location_date_time_last_year(self, buckets=DEFAULT_TIME_BUCKETS, location=None):
+        return self._aggregate('location_date_time', 'last_year', buckets, location)
+
     def count_by_month(self, df):
-        return df.groupby(['month']).agg({'pedestrians_count': 'sum',"month_year":'first'},sort=False)
-        
-        
-    def count_by_month_last_year(self): 
-        return self.count_by_month(self.DF_LAST_YEAR)
-        
-    def count_by_month_previous_year(self): 
-        return self.count_by_month(self.DF_PREVIOUS_YEAR)
-        
-        
-    def count_by_day(self, df): 
-        return df.groupby(['date']).agg({'pedestrians_count': 'sum', 'day': 'first','month':'first',"month_year":'first' },sort=False)
-        
-    def count_by_day_last_year(self): 
-        return self.count_by_day(self.DF_LAST_YEAR)
-        
-
-    def location_day_time(self,df):
-        df_by_year = df.groupby(["day",'time_of_day', 'location_name']).agg(
-                {"pedestrians_count": "sum" })
-        return df_by_year
-
-    def location_day_time_last_year(self):
-        return self.location_day_time(self.DF_LAST_YEAR)
+        return aggregate_frame(df, *ROLLUPS['count_by_month'])
+
+    def count_by_month_last_year(self):
+        return self._aggregate('count_by_month', 'last_year')
+
+    def count_by_month_previous_year(self):
+        return self._aggregate('count_by_month', 'previous_year')
+
+    def count_by_day(self, df):
+        return aggregate_frame(df, *ROLLUPS['count_by_day'])
+
+    def count_by_day_last_year(self):
+        return self._aggregate('count_by_day', 'last_year')
+
+    def location_day_time(self, df, buckets=DEFAULT_TIME_BUCKETS):
+        return aggregate_frame(with_time_buckets(df, buckets), *ROLLUPS['location_day_time'])
+
+    def location_day_time_last_year(self, buckets=DEFAULT_TIME_BUCKETS, location=None):
+        return self._aggregate('location_day_time', 'last_year', buckets, location)
+
+    def count_by_location(self, df):
+        return aggregate_frame(df, *ROLLUPS['count_by_location'])
 
-    
-    def count_by_location(self, df): 
-        return df.groupby(['location_name']).agg({'pedestrians_count': 'sum' },sort=False)
-    
     def count_by_location_last_year(self):
-        return self.count_by_location(self.DF_LAST_YEAR)
-        
\ No newline at end of file
+        return self._aggregate('count_by_location', 'last_year')
+
+    def _range_boundaries(self, start, end, freq):
+        # hour axis positions of start, of every day / month start in between and of end
+        if freq not in ('D', 'M'):
+            raise ValueError(f"freq must be 'D' or 'M', not {freq!r}")
+        lo, hi = self.cube.hour_range(start, end)
+        return np.unique(np.concatenate([[lo], self.cube.local_starts(lo, hi, freq), [hi]]))
+
+    def compare_periods(self, periods=('previous_year', 'last_year'), align='month', column='pedestrians_count'):
+        # totals of any number of periods (names of self.periods or (start, end) pairs) per
+        # calendar month ('month', aligned by month of the year) or per week since the start of
+        # each period ('week', aligned by that position), see PeriodComparison
+        return self._memoized(self._compare_periods, tuple(periods), align, column)
+
+    def _compare_periods(self, periods, align, column):
+        boundaries = [self._bucket_boundaries(*(self.periods[period] if isinstance(period, str) else period), align)
+                      for period in periods]
+        if align == 'month':
+            # calendar month of every period's first bucket, a period goes in as many columns
+            # after the first period as its first month is after the first period's month
+            months = [int((self.cube.local_hours(hours[:1]) // 24).astype('datetime64[D]')
+                          .astype('datetime64[M]').astype('int64')[0]) for hours in boundaries]
+            offsets = [(month - months[0]) % 12 for month in months]
+        else:
+            offsets = [0] * len(periods)
+        totals = np.full((len(periods), max(offset + len(hours) - 1 for offset, hours in zip(offsets, boundaries))),
+                         np.nan)
+        for i, (offset, hours) in enumerate(zip(offsets, boundaries)):
+            covered = np.clip(hours, 0, self.cube.rows.shape[1])
+            period_totals = self.cube.totals(column, covered).astype('float64')
+            period_totals[covered[1:] == covered[:-1]] = np.nan
+            totals[i, offset:offset + len(period_totals)] = period_totals
+
+        n_buckets = totals.shape[1]
+        if align == 'month':
+            labels = tuple(MONTHS[(months[0] + bucket) % 12] if n_buckets <= 12
+                           else f"{MONTHS[(months[0] + bucket) % 12]} ({bucket // 12 + 1})"
+                           for bucket in range(n_buckets))
+        else:
+            labels = tuple(f"Week {week}" for week in range(1, n_buckets + 1))
+
+        deltas = np.diff(totals, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            changes = deltas / totals[:-1] * 100
+        return PeriodComparison(periods, labels, totals, deltas, changes)
+
+    def summary(self, period='last_year', previous='previous_year', column='pedestrians_count',
+                buckets=DEFAULT_TIME_BUCKETS):
+        # the facts behind the dashboard headline and key points, see Summary. The cells of the
+        # period are read once, every fact is a bincount of them.
+        return self._memoized(self._summary, period, previous, column, buckets)
+
+    def _summary(self, period, previous, column, buckets):
+        time_of_day, categories = time_buckets(buckets)
+        location, hour, _, values = self._period_cells(period, column)
+        values = values.astype('float64')
+        locations = self.df['location_name'].cat.categories
+
+        location_totals = np.bincount(location, weights=values, minlength=len(locations))
+        day_totals = np.bincount(self.cube.hour_of_week(hour) // 24, weights=values, minlength=len(DAYS))
+        # time of day totals per month, a month counts for the time of day busiest in it
+        local = self.cube.local_hours(hour)
+        month = (local // 24).astype('datetime64[D]').astype('datetime64[M]').astype('int64')
+        month -= month.min(initial=0)
+        n_months = int(month.max(initial=0)) + 1
+        month_totals = np.bincount(month * len(categories) + time_of_day[local % 24], weights=values,
+                                   minlength=n_months * len(categories)).reshape(n_months, len(categories))
+        bucket_totals = month_totals.sum(axis=0)
+        busiest_bucket = int(bucket_totals.argmax())
+        busiest_months = month_totals[month_totals.sum(axis=1) > 0].argmax(axis=1)
+
+        location_totals = pd.Series(np.rint(location_totals).astype('int64'), index=locations, name=column)
+        location_totals = location_totals[location_totals > 0].sort_values(ascending=False, kind='stable')
+        ratio = location_totals.iloc[0] / location_totals.iloc[1] if len(location_totals) > 1 else np.nan
+        total = int(location_totals.sum())
+        previous_total = self.range_total(*self.periods[previous], column=column)
+        change = (total - previous_total) / previous_total * 100 if previous_total else np.nan
+        return Summary(total, location_totals, float(ratio), previous_total, float(change),
+                       DAYS[int(day_totals.argmax())], categories[busiest_bucket],
+                       float((busiest_months == busiest_bucket).mean()) if len(busiest_months) else np.nan)
+
+    def _bucket_boundaries(self, start, end, align):
+        # hour axis positions (not clipped to the loaded data) of the start, of every month /
+        # week start in between and of the end of a period
+        lo = self.cube.hour_index(start, clip=False)
+        hi = max(self.cube.hour_index(end, end=True, clip=False), lo)
+        if align not in ('month', 'week'):
+            raise ValueError(f"align must be 'month' or 'week', not {align!r}")
+        starts = self.cube.local_starts(lo, hi, 'M' if align == 'month' else 'W')
+        return np.unique(np.concatenate([[lo], starts, [hi]]))
+
+    def range_total(self, start, end, location=None, column='pedestrians_count'):
+        # total count of [start, end) for one location (None: all of them) from two lookups
+        # in the prefix sums, e.g. for a freely chosen date range
+        with self._data_lock:
+            boundaries = list(self.cube.hour_range(start, end))
+            return int(self.cube.totals(column, boundaries, self._location_code(location))[0])
+
+    def range_series(self, start, end, freq='D', location=None, column='pedestrians_count'):
+        # daily ('D') or monthly ('M') totals of [start, end) as differences of the prefix
+        # sums, indexed by the local start of each day / month (partial at the ends)
+        return self._memoized(self._range_series, start, end, freq, location, column)
+
+    def _range_series(self, start, end, freq, location, column):
+        boundaries = self._range_boundaries(start, end, freq)
+        totals = self.cube.totals(column, boundaries, self._location_code(location))
+        starts = (self.cube.local_hours(boundaries[:-1]) // 24).astype('datetime64[D]')
+        if freq == 'M':
+            starts = starts.astype('datetime64[M]')
+        return pd.Series(totals, index=pd.DatetimeIndex(starts, name='date' if freq == 'D' else 'month'),
+                         name=column)
+
+    def baseline(self, column='pedestrians_count'):
+        # robust location x hour of week profile (median and spread) of the hourly counts. The
+        # cells are UTC hours, so the two hours of the autumn DST change are separate values of
+        # the Sunday 02:00 slot rather than one cell holding both.
+        with self._data_lock:
+            if column not in self._baselines:
+                location, hour = np.nonzero(self.cube.rows)
+                values = self.cube.counts[self.cube.columns.index(column), location, hour]
+                self._baselines[column] = SeasonalBaseline(self._week_slots(location, hour), values,
+                                                           self.cube.rows.shape[0] * HOURS_PER_WEEK)
+            return self._baselines[column]
+
+    def _week_slots(self, location, hour):
+        return location * HOURS_PER_WEEK + self.cube.hour_of_week(hour)
+
+    def _update_baselines(self, rows):
+        # appended hours are inserted into the baselines. Rows for an hour that already had a
+        # count (or for a new location) change existing values, the baselines are rebuilt.
+        if not self._baselines:
+            return
+        location, hour = self.cube.cells(rows)
+        n_slots = self.cube.rows.shape[0] * HOURS_PER_WEEK
+        if ((self.cube.rows[location, hour] != 1).any()
+                or any(len(baseline.median) != n_slots for baseline in self._baselines.values())):
+            self._baselines = {}
+            return
+        for column, baseline in self._baselines.items():
+            baseline.add(self._week_slots(location, hour),
+                         self.cube.counts[self.cube.columns.index(column), location, hour])
+
+    def score_hour(self, location, timestamp, value, column='pedestrians_count'):
+        # robust z-score of a single (e.g. just received) hourly count, two lookups
+        local = to_utc(timestamp).tz_convert(LOCAL_TZ)
+        slot = self._location_code(location) * HOURS_PER_WEEK + local.dayofweek * 24 + local.hour
+        with self._data_lock:
+            return float(self.baseline(column).score(slot, value))
+
+    def _period_cells(self, period, column, location=None):
+        # the hours of a period (a name of self.periods or a (start, end) pair) that have a
+        # count: location codes, hour axis positions, baseline slots and counts. A location
+        # restricts them to its slice of the cube.
+        lo, hi = self.cube.hour_range(*(self.periods[period] if isinstance(period, str) else period))
+        first = 0 if location is None else self._location_code(location)
+        last = None if location is None else first + 1
+        location, hour = np.nonzero(self.cube.rows[first:last, lo:hi])
+        location += first
+        hour += lo
+        values = self.cube.counts[self.cube.columns.index(column), location, hour]
+        return location, hour, self._week_slots(location, hour), values
+
+    def hourly_scores(self, period='last_year', column='pedestrians_count'):
+        # every hour of a period against the baseline: count, expected (median) count, spread
+        # and robust z-score, indexed by location and (time zone aware) local time
+        return self._memoized(self._hourly_scores, period, column)
+
+    def _hourly_scores(self, period, column):
+        location, hour, slots, values = self._period_cells(period, column)
+        baseline = self.baseline(column)
+        index = pd.MultiIndex.from_arrays(
+            [pd.Categorical.from_codes(location, dtype=self.df['location_name'].dtype),
+             self._local_times(hour)],
+            names=['location_name', 'time'])
+        return pd.DataFrame({column: values, 'expected': baseline.median[slots],
+                             'spread': baseline.spread[slots], 'score': baseline.score(slots, values)},
+                            index=index)
+
+    def daily_scores(self, period='last_year', column='pedestrians_count'):
+        # every day of a period: its total against the sum of the expected counts of its
+        # hours. Hours of a day move together (weather, holidays), so their spreads add up.
+        return self._memoized(self._daily_scores, period, column)
+
+    def _daily_scores(self, period, column):
+        location, hour, slots, values = self._period_cells(period, column)
+        baseline = self.baseline(column)
+        day = self.cube.local_hours(hour) // 24 - self.cube.first_day.astype('int64')
+        n_days = int(day.max(initial=0)) + 1
+        keys, groups = np.unique(location * n_days + day, return_inverse=True)
+
+        total = np.bincount(groups, weights=values, minlength=len(keys))
+        expected = np.bincount(groups, weights=baseline.median[slots], minlength=len(keys))
+        spread = np.bincount(groups, weights=baseline.spread[slots], minlength=len(keys))
+        index = pd.MultiIndex.from_arrays(
+            [pd.Categorical.from_codes(keys // n_days, dtype=self.df['location_name'].dtype),
+             pd.DatetimeIndex(self.cube.first_day + keys % n_days)],
+            names=['location_name', 'date'])
+        return pd.DataFrame({column: np.rint(total).astype('int64'), 'expected': expected, 'spread': spread,
+                             'score': (total - expected) / spread}, index=index)
+
+    def day_densities(self, period='last_year', points=50):
+        # the daily totals of each weekday as kernel densities on a fixed grid and quartiles,
+        # see DayDensities, instead of every daily row. A few dozen points draw a smooth curve.
+        return self._memoized(self._day_densities, period, points)
+
+    def _day_densities(self, period, points):
+        daily = self._aggregate('count_by_day', period)
+        return DayDensities(*kernel_densities(daily['day'].cat.codes.values.astype('int64'),
+                                              daily['pedestrians_count'].values, len(DAYS), points))
+
+    def hierarchy(self, dims=('location_name', 'day', 'time_of_day'), period='last_year',
+                  column='pedestrians_count', buckets=DEFAULT_TIME_BUCKETS):
+        # the counts of a period per node of the hierarchy of fields in dims (outermost first,
+        # any of location_name, month, day, time_of_day and hour), see Hierarchy
+        return self._memoized(self._hierarchy, tuple(dims), period, column, buckets)
+
+    def _hierarchy(self, dims, period, column, buckets):
+        labels = {'location_name': list(self.df['location_name'].cat.categories),
+                  'month': list(self.df['month'].cat.categories),
+                  'day': DAYS,
+                  'time_of_day': time_buckets(buckets)[1],
+                  'hour': [f"{hour:02d}:00" for hour in range(24)]}
+        unknown = [name for name in dims if name not in labels]
+        if unknown or not dims:
+            raise ValueError(f"dims must be some of {list(labels)}, not {list(dims)!r}")
+
+        first_month = MONTHS.index(labels['month'][0])
+        location, hour, _, keys = self.cube.cell_keys(*self.periods[period], first_month, buckets)
+        values = self.cube.counts[self.cube.columns.index(column), location, hour]
+        return Hierarchy(*hierarchy_arrays([keys[name] for name in dims], [len(labels[name]) for name in dims],
+                                           [labels[name] for name in dims], values))
+
+    def week_heatmap(self, period='last_year', location=None, column='pedestrians_count'):
+        # counts per hour of week (rows, Monday 00:00 first) and ISO week (columns, e.g.
+        # "2023-W07") of a period, for one location or (None) all of them. Hours without a
+        # count are NaN.
+        return self._memoized(self._week_heatmap, period, location, column)
+
+    def _week_heatmap(self, period, location, column):
+        _, hour, _, values = self._period_cells(period, column, location)
+        # weeks since Monday 1969-12-29, day 0 (1970-01-01) is a Thursday
+        week = (self.cube.local_hours(hour) // 24 + 3) // 7
+        first_week = int(week.min()) if len(week) else 0
+        n_weeks = int(week.max()) - first_week + 1 if len(week) else 0
+
+        cells = self.cube.hour_of_week(hour) * n_weeks + week - first_week
+        size = HOURS_PER_WEEK * n_weeks
+        # float even without cells, bincount of an empty array is an integer array
+        totals = np.bincount(cells, weights=values, minlength=size).astype('float64').reshape(HOURS_PER_WEEK, n_weeks)
+        totals[np.bincount(cells, minlength=size).reshape(HOURS_PER_WEEK, n_weeks) == 0] = np.nan
+
+        mondays = pd.DatetimeIndex(np.datetime64('1969-12-29') + (first_week + np.arange(n_weeks)) * 7)
+        iso = mondays.isocalendar()
+        weeks = [f"{year}-W{week:02d}" for year, week in zip(iso['year'], iso['week'])]
+        return pd.DataFrame(totals, index=pd.RangeIndex(HOURS_PER_WEEK, name='hour_of_week'),
+                            columns=pd.Index(weeks, name='week'))
+
+    def events(self, period='last_year', threshold=3.0, calendar_file=EVENTS_FILE_NAME):
+        # peaks of the daily counts (see detect_peaks()) named after the event calendar:
+        # date, count, score and name (None for peaks that match no known event)
+        return self._memoized(self._events, period, threshold, calendar_file)
+
+    def _events(self, period, threshold, calendar_file):
+        daily = self._aggregate('count_by_day', period)
+        # one value per day, days without counts are NaN so weekdays stay aligned
+        days = np.asarray(daily.index, dtype='datetime64[D]')
+        positions = (days - days.min()).astype('int64') if len(days) else days.astype('int64')
+        values = np.full(positions.max(initial=-1) + 1, np.nan)
+        values[positions] = daily['pedestrians_count'].values
+
+        peaks, scores = detect_peaks(values, threshold=threshold)
+        dates = pd.DatetimeIndex(days.min() + peaks) if len(days) else pd.DatetimeIndex([])
+        return pd.DataFrame({'date': dates, 'pedestrians_count': values[peaks].astype('int64'), 'score': scores,
+                             'name': name_events(dates, read_event_calendar(calendar_file))})
+
+    def _local_times(self, hours):
+        # hour axis positions as local times, unambiguous around the DST changes
+        utc = (self.cube.origin + hours).astype('datetime64[h]').astype('datetime64[ns]')
+        return pd.DatetimeIndex(utc).tz_localize('UTC').tz_convert(LOCAL_TZ)
+
+    def _location_code(self, location):
+        if location is None:
+            return None
+        return self.locations.code(location)
+
+    def memory_usage(self):
+        # bytes held per column, the periods are views and hold nothing of their own
+        report = pd.DataFrame({'bytes': self.df.memory_usage(index=False, deep=True),
+                               'dtype': self.df.dtypes})
+        report.loc['total'] = [report['bytes'].sum(), None]
+        return report
+
+
+def source_stat(file_name):
+    stat = os.stat(file_name)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class DataReloader():
+    # Holds the current snapshot (by default a DataManager) and rebuilds it in a background
+    # thread when the source csv changes. The new snapshot replaces the old one with a single
+    # reference assignment: readers call current() once and keep using what they got, while
+    # new requests are served from the old snapshot until the new one is completely built.
+
+    def __init__(self, file_name=DEFAULT_FILE_NAME, interval=60, build=None, **manager_args):
+        self.file_name = file_name
+        self.interval = interval
+        self.build = build
+        self.manager_args = manager_args
+
+        self._stat = source_stat(file_name)
+        self._snapshot = self._load()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load(self):
+        data_manager = DataManager(self.file_name, **self.manager_args)
+        return self.build(data_manager) if self.build else data_manager
+
+    def current(self):
+        return self._snapshot
+
+    def reload(self):
+        stat = source_stat(self.file_name)
+        snapshot = self._load()
+        self._stat = stat
+        self._snapshot = snapshot
+        LOG.info("reloaded data from %s", self.file_name)
+
+    def _watch(self):
+        last_seen = self._stat
+        while not self._stop.wait(self.interval):
+            try:
+                stat = source_stat(self.file_name)
+                # only reload once the file stopped changing for one interval, so a csv that
+                # is still being downloaded is not picked up half written
+                if stat != self._stat and stat == last_seen:
+                    self.reload()
+                last_seen = stat
+            except Exception:
+                LOG.exception("reloading %s failed, keeping the current data", self.file_name)
+
+    def start(self):
+        if self.interval is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="DataReloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from DataHelper import DataManager, ROLLUPS, TIME_BUCKETS, DEFAULT_TIME_BUCKETS, with_time_buckets
+
+# Checks the cube based queries against plain pandas on a small synthetic hystreet export:
+#
+#   python3 -m pytest test_DataHelper.py
+#
+# Both periods of the data contain an autumn DST change (2021-10-31 and 2022-10-30), where
+# the local hour 02:00 happens twice.
+
+LOCATIONS = ['Bahnhofstrasse (Mitte)', 'Bahnhofstrasse (Süd)', 'Bahnhofstrasse (Nord)']
+FIRST_HOUR = '2020-12-01T00:00Z'
+LAST_HOUR = '2022-11-10T23:00Z'
+COUNT_COLUMNS = ['pedestrians_count', 'adult_pedestrians_count', 'child_pedestrians_count']
+
+
+def source_rows(seed=0):
+    # hourly rows of every location in the csv format, sorted by timestamp
+    hours = pd.date_range(FIRST_HOUR, LAST_HOUR, freq='h')
+    rng = np.random.default_rng(seed)
+    adults = rng.integers(0, 500, (len(hours), len(LOCATIONS)))
+    children = rng.integers(0, 30, (len(hours), len(LOCATIONS)))
+    return pd.DataFrame({
+        'location_name': np.tile(LOCATIONS, len(hours)),
+        'timestamp': np.repeat(hours.strftime('%Y-%m-%dT%H:%M:%S.000+00:00'), len(LOCATIONS)),
+        'pedestrians_count': (adults + children).ravel(),
+        'adult_pedestrians_count': adults.ravel(),
+        'child_pedestrians_count': children.ravel(),
+    })
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return source_rows()
+
+
+@pytest.fixture(scope='module')
+def data_manager(rows, tmp_path_factory):
+    file_name = tmp_path_factory.mktemp('data') / 'counts.csv'
+    rows.to_csv(file_name, index=False)
+    return DataManager(str(file_name), use_cache=False)
+
+
+def pandas_rollup(df, method):
+    # the groupby the cube replaces
+    by, sums, firsts = ROLLUPS[method]
+    return df.groupby(by, observed=True).agg({**{col: 'sum' for col in sums}, **{col: 'first' for col in firsts}})
+
+
+@pytest.mark.parametrize('period', ['previous_year', 'last_year'])
+@pytest.mark.parametrize('method', list(ROLLUPS))
+def test_reduce_matches_groupby(data_manager, method, period):
+    by, sums, firsts = ROLLUPS[method]
+    for buckets in TIME_BUCKETS if 'time_of_day' in by else [DEFAULT_TIME_BUCKETS]:
+        expected = pandas_rollup(with_time_buckets(data_manager.period(period), buckets), method)
+        result = data_manager.cube.reduce(*data_manager.periods[period], by, sums, firsts,
+                                          data_manager.df.dtypes, buckets)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_reduce_of_one_location(data_manager):
+    location = 'Bahnhofstrasse (Süd)'
+    df = data_manager.period('last_year')
+    expected = pandas_rollup(df[df['location_name'] == location], 'location_day_time')
+    result = data_manager.location_day_time_last_year(location=location)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_excluded_location_is_dropped(data_manager):
+    assert list(data_manager.locations) == ['Bahnhofstrasse (Mitte)', 'Bahnhofstrasse (Süd)']
+
+
+def test_dst_change_hours_are_separate_cells(data_manager):
+    # 00:00Z and 01:00Z of 2022-10-30 are both 02:00 local time
+    window = data_manager.window('2022-10-30T00:00Z', '2022-10-30T02:00Z')
+    assert len(window) == 2 * len(data_manager.locations)
+    assert data_manager.range_total('2022-10-30T00:00Z', '2022-10-30T01:00Z') == \
+        window.iloc[:len(data_manager.locations)]['pedestrians_count'].sum()
+
+
+RANGES = [
+    ('2022-10-30T00:00Z', '2022-10-30T01:00Z'),
+    ('2022-10-29', '2022-10-31'),
+    ('2022-03-27', '2022-03-28'),
+    ('2022-01-01', '2022-07-01'),
+    ('2021-10-31 01:00', '2021-10-31 04:00'),
+    (pd.Timestamp('2021-12-01', tz='Europe/Zurich'), pd.Timestamp('2022-11-11', tz='Europe/Zurich')),
+]
+
+
+@pytest.mark.parametrize('location', [None, 'Bahnhofstrasse (Mitte)'])
+@pytest.mark.parametrize('start, end', RANGES)
+def test_range_total_matches_window_sum(data_manager, start, end, location):
+    for column in COUNT_COLUMNS:
+        df = data_manager.window(start, end)
+        if location is not None:
+            df = df[df['location_name'] == location]
+        assert data_manager.range_total(start, end, location, column) == df[column].sum()
+
+
+@pytest.mark.parametrize('freq', ['D', 'M'])
+def test_range_series_adds_up_to_range_total(data_manager, freq):
+    start, end = data_manager.periods['last_year']
+    series = data_manager.range_series(start, end, freq)
+    assert series.sum() == data_manager.range_total(start, end)
+
+
+def test_range_series_months_match_the_calendar_fields(data_manager):
+    start, end = data_manager.periods['last_year']
+    series = data_manager.range_series(start, end, 'M')
+    months = data_manager.count_by_month_last_year()['pedestrians_count']
+    assert list(series.values) == list(months.values)
+
+
+QUERIES = ['location_date_time_last_year', 'count_by_month_last_year', 'count_by_month_previous_year',
+           'count_by_day_last_year', 'location_day_time_last_year', 'count_by_location_last_year']
+
+
+# the first cut appends within the newest month, the second one moves the periods
+@pytest.mark.parametrize('cut', ['2022-11-03T05:00Z', '2022-10-28T00:00Z'])
+def test_append_matches_rebuild(data_manager, rows, tmp_path, cut):
+    timestamps = pd.to_datetime(rows['timestamp'], utc=True)
+    file_name = tmp_path / 'part.csv'
+    rows[timestamps < pd.Timestamp(cut)].to_csv(file_name, index=False)
+    appended = DataManager(str(file_name), use_cache=False)
+    for query in QUERIES:
+        getattr(appended, query)()
+    appended.baseline()
+
+    rest = rows[timestamps >= pd.Timestamp(cut)]
+    # one row at a time, a batch in reverse order and the rest at once
+    for i in range(5):
+        appended.append(rest.iloc[i:i + 1])
+    appended.append(rest.iloc[5:200].iloc[::-1])
+    appended.append(rest.iloc[200:])
+
+    assert appended.periods == data_manager.periods
+    for query in QUERIES:
+        pd.testing.assert_frame_equal(getattr(appended, query)(), getattr(data_manager, query)(),
+                                      check_categorical=False)
+    for start, end in RANGES:
+        assert appended.range_total(start, end) == data_manager.range_total(start, end)
+
+    baseline, rebuilt = appended.baseline(), data_manager.baseline()
+    np.testing.assert_array_equal(baseline.values, rebuilt.values)
+    np.testing.assert_array_equal(baseline.median, rebuilt.median)
+    np.testing.assert_array_equal(baseline.spread, rebuilt.spread)